@@ -0,0 +1,155 @@
+#!python3
+from dataclasses import asdict, dataclass
+import glob
+import os.path
+import time
+import click
+import pandas as pd
+from pathos.multiprocessing import ProcessPool
+from trade import BEAM_WIDTH, run_day, search_day
+
+
+@dataclass(frozen=True, kw_only=True, slots=True)
+class DayResult:
+    symbol: str
+    day: str
+    best_score: float
+    confirmed_score: float
+    best_path: str
+    runtime: float
+
+
+def day_of(file: str) -> str:
+    return os.path.splitext(os.path.basename(file))[0]
+
+
+def select_days(pattern: str, start: str, end: str) -> list[str]:
+    files = sorted(glob.glob(pattern), key=day_of)
+    return [
+        f
+        for f in files
+        if (not start or day_of(f) >= start) and (not end or day_of(f) <= end)
+    ]
+
+
+def select_units(
+    pattern: str, symbols: list[str], start: str, end: str
+) -> list[tuple[str, str]]:
+    """(symbol, file) of every day of every symbol, ordered by day.
+
+    The pattern names each symbol's files with a {symbol} placeholder, like
+    ./data/{symbol}/*.csv. Without symbols it is a single instrument's glob,
+    whose units have an empty symbol. Symbols of the same day are next to
+    each other, so that a pool works through the days together.
+    """
+    if not symbols:
+        return [("", f) for f in select_days(pattern, start, end)]
+    units = [
+        (symbol, f)
+        for symbol in symbols
+        for f in select_days(pattern.format(symbol=symbol), start, end)
+    ]
+    return sorted(units, key=lambda unit: (day_of(unit[1]), unit[0]))
+
+
+@click.command()
+@click.option("--glob", "pattern", default="./data/*.csv")
+@click.option(
+    "--symbol",
+    "symbols",
+    multiple=True,
+    help="Runs each symbol's files, with {symbol} in the glob.",
+)
+@click.option("--start", default=None, help="First day, YYYY-MM-DD.")
+@click.option("--end", default=None, help="Last day, YYYY-MM-DD.")
+@click.option("--solver", type=click.Choice(["bfs", "beam", "dp"]), default="bfs")
+@click.option(
+    "--beam-width",
+    type=click.IntRange(min=1),
+    default=BEAM_WIDTH,
+    help="Paths kept per level.",
+)
+@click.option("--diversity", type=click.IntRange(min=1), default=None)
+@click.option("--shared-memory", is_flag=True)
+@click.option("--worker-bank", is_flag=True)
+@click.option("--score-cache", is_flag=True)
+@click.option("--timeframe", type=int, default=None, help="Bar size in minutes.")
+@click.option("-o", "--output", default="./batch_summary.csv")
+def main(
+    pattern,
+    symbols,
+    start,
+    end,
+    solver,
+    beam_width,
+    diversity,
+    shared_memory,
+    worker_bank,
+    score_cache,
+    timeframe,
+    output,
+):
+    if symbols and "{symbol}" not in pattern:
+        raise click.UsageError("--symbol needs a {symbol} placeholder in --glob")
+    units = select_units(pattern, list(symbols), start, end)
+    print(f"{len(units)} days" + (f" of {len(symbols)} symbols" if symbols else ""))
+    if not units:
+        return
+
+    def run_one_day(unit) -> DayResult:
+        # Each worker owns one day of one symbol, so the day's own search runs
+        # serially instead of opening a pool inside the pool.
+        symbol, file = unit
+        started = time.time()
+        best_profit, best_path = search_day(
+            file,
+            solver=solver,
+            shared_memory=shared_memory,
+            worker_bank=worker_bank,
+            score_cache=score_cache,
+            imap=map,
+            beam_width=beam_width,
+            diversity=diversity,
+            timeframe=timeframe,
+        )
+        cerebro, derstrat = run_day(file, best_path, plot=False, timeframe=timeframe)
+        return DayResult(
+            symbol=symbol,
+            day=day_of(file),
+            best_score=best_profit,
+            confirmed_score=derstrat.selector.get_score(),
+            best_path=" ".join(str(x) for x in best_path),
+            runtime=time.time() - started,
+        )
+
+    results = []
+    with ProcessPool() as pool:
+        for result in pool.uimap(run_one_day, units):
+            print(
+                f"{result.symbol} {result.day} {result.best_score:.2f} "
+                f"{result.runtime:.1f}s".lstrip()
+            )
+            results.append(result)
+
+    summary = pd.DataFrame([asdict(x) for x in results]).sort_values(["symbol", "day"])
+    if not symbols:
+        summary = summary.drop(columns="symbol")
+    summary.to_csv(output, index=False)
+    print(summary.drop(columns="best_path").to_string(index=False))
+    if symbols:
+        per_symbol = summary.groupby("symbol").agg(
+            days=("day", "size"),
+            total_score=("best_score", "sum"),
+            mean_score=("best_score", "mean"),
+            runtime=("runtime", "sum"),
+        )
+        print(per_symbol.to_string())
+    print(
+        f"total score {summary.best_score.sum():.2f}, "
+        f"mean {summary.best_score.mean():.2f}, "
+        f"runtime {summary.runtime.sum():.1f}s over {len(summary)} days"
+    )
+
+
+if __name__ == "__main__":
+    main()
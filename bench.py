@@ -0,0 +1,202 @@
+#!python3
+from contextlib import contextmanager, redirect_stdout
+import datetime
+import glob
+import io
+import json
+import math
+import random
+import subprocess
+import sys
+import time
+from typing import Callable, Iterator
+import backtrader as bt
+import click
+from mytrade.indicator_registry import IndicatorRegistry
+from mytrade.pandadata import PandasData
+from mytrade.weighted_hma import WeightedHMA
+from mytrade.whma_selector import HeadlessWHMASelector
+from trade import PERIOD, WHMA_PARAMS, run_once, search_day
+
+
+class WHMAOnly(bt.Strategy):
+    params = [("whma_params", [])]
+
+    def __init__(self):
+        indicators = IndicatorRegistry()
+        self.whmas = [
+            WeightedHMA.shared(indicators, self.data, plot=False, h1=h1, h2=h2)
+            for h1, h2 in self.p.whma_params
+        ]
+
+
+@contextmanager
+def timed_method(cls, name: str) -> Iterator[list[float]]:
+    """Accumulates the wall time spent in cls.name while the context is open."""
+    elapsed = [0.0]
+    method = getattr(cls, name)
+
+    def wrapper(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            elapsed[0] += time.perf_counter() - started
+
+    setattr(cls, name, wrapper)
+    try:
+        yield elapsed
+    finally:
+        setattr(cls, name, method)
+
+
+def random_sequence(data_len: int) -> list[int]:
+    return [
+        random.randrange(len(WHMA_PARAMS)) for _ in range(math.ceil(data_len / PERIOD))
+    ]
+
+
+def run_sequence(data, file, data_len, greedy, headless=False):
+    return run_once(
+        data,
+        name=file,
+        plot=False,
+        whma_sequence=[] if greedy else random_sequence(data_len),
+        period=PERIOD,
+        partial_run=None,
+        greedy=greedy,
+        whma_params=WHMA_PARAMS,
+        headless=headless,
+    )
+
+
+def bench_whma(file) -> tuple[int, float]:
+    data, df = PandasData(file)
+    cerebro = bt.Cerebro(stdstats=False)
+    cerebro.adddata(data, name=file)
+    cerebro.addstrategy(WHMAOnly, whma_params=WHMA_PARAMS)
+    started = time.perf_counter()
+    cerebro.run()
+    return df.shape[0] * len(WHMA_PARAMS), time.perf_counter() - started
+
+
+def bench_period_end(greedy: bool) -> Callable[[str], tuple[int, float]]:
+    def bench(file) -> tuple[int, float]:
+        data, df = PandasData(file)
+        with timed_method(
+            HeadlessWHMASelector, "_HeadlessWHMASelector__period_end"
+        ) as elapsed:
+            run_sequence(data, file, df.shape[0], greedy)
+        return df.shape[0], elapsed[0]
+
+    return bench
+
+
+def bench_run_once(headless: bool) -> Callable[[str], tuple[int, float]]:
+    def bench(file) -> tuple[int, float]:
+        data, df = PandasData(file)
+        started = time.perf_counter()
+        run_sequence(data, file, df.shape[0], greedy=False, headless=headless)
+        return df.shape[0], time.perf_counter() - started
+
+    return bench
+
+
+def bench_bfs_level(**kwargs) -> Callable[[str], tuple[int, float]]:
+    def bench(file) -> tuple[int, float]:
+        started = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            search_day(file, max_levels=1, **kwargs)
+        return len(WHMA_PARAMS) ** 2, time.perf_counter() - started
+
+    return bench
+
+
+BENCHMARKS = {
+    "whma": ("bars/s", bench_whma),
+    "period_end_greedy": ("bars/s", bench_period_end(greedy=True)),
+    "period_end_sequence": ("bars/s", bench_period_end(greedy=False)),
+    "run_once": ("bars/s", bench_run_once(headless=False)),
+    "run_once_headless": ("bars/s", bench_run_once(headless=True)),
+    "bfs_level_shared": ("paths/s", bench_bfs_level(shared_memory=True)),
+    "bfs_level_bank": ("paths/s", bench_bfs_level(worker_bank=True)),
+    "bfs_level": ("paths/s", bench_bfs_level()),
+}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    slower = []
+    for name, result in results.items():
+        if name not in baseline["results"]:
+            continue
+        before = baseline["results"][name]["rate"]
+        change = result["rate"] / before - 1
+        print(f"{name:<22} {before:>12.1f} -> {result['rate']:>12.1f} {change:+.1%}")
+        if change < -threshold:
+            slower.append(name)
+    return slower
+
+
+@click.command()
+@click.option("--glob", "pattern", default="./data/*.csv")
+@click.option("--days", default=1, help="Number of day files, evenly spaced.")
+@click.option("--repeat", default=3, help="Best of N runs per benchmark.")
+@click.option("-k", "select", multiple=True, help="Only run benchmarks with this name.")
+@click.option("-o", "--output", default=None, help="Write results as JSON.")
+@click.option("--baseline", default=None, help="JSON results to compare against.")
+@click.option("--threshold", default=0.1, help="Allowed slowdown, 0.1 is 10%.")
+def main(pattern, days, repeat, select, output, baseline, threshold):
+    files = sorted(glob.glob(pattern))
+    files = files[:: max(1, len(files) // days)][:days]
+    random.seed(0)
+
+    results = {}
+    for name, (unit, bench) in BENCHMARKS.items():
+        if select and name not in select:
+            continue
+        best = math.inf
+        for _ in range(repeat):
+            runs = [bench(f) for f in files]
+            count = sum(c for c, _ in runs)
+            best = min(best, sum(s for _, s in runs))
+        results[name] = {
+            "rate": count / best,
+            "unit": unit,
+            "count": count,
+            "seconds": best,
+        }
+        print(f"{name:<22} {count / best:>12.1f} {unit}", flush=True)
+
+    report = {
+        "commit": git_commit(),
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "files": files,
+        "repeat": repeat,
+        "results": results,
+    }
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if baseline:
+        with open(baseline) as f:
+            slower = compare(results, json.load(f), threshold)
+        if slower:
+            print(f"slower than baseline by more than {threshold:.0%}: {slower}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
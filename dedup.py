@@ -1,41 +1,121 @@
 #!python3
 
 from datetime import datetime
+import heapq
+import itertools
+import os
+import tempfile
+from typing import Iterable, Iterator, TextIO
 import click
 
 # time,open,high,low,close
+HEADER = "time,open,high,low,close"
 
 
-@click.command()
-@click.argument("input", type=click.File("r"))
-def main(input):
-    visited = set()
-    deduped = []
-    for ln in input.readlines():
+def parse_rows(input: TextIO) -> Iterator[tuple]:
+    for ln in input:
         ln: str
         time, *ohlc = ln.strip().split(",")[:5]
         try:
             time, *ohlc = int(time), *ohlc
         except ValueError:
             continue
-        if time not in visited:
-            visited.add(time)
-            deduped.append((time, *ohlc))
-    deduped.sort()
-    cur_date, cur_file = None, None
-    for (time, *ohlc) in deduped:
-        dt = datetime.utcfromtimestamp(time)
-        if dt.date() != cur_date:
-            cur_date = dt.date()
-            if cur_file:
-                cur_file.close()
-            fname = "data/" + cur_date.strftime("%Y-%m-%d.csv")
-            cur_file = open(fname, "w")
-            print("time,open,high,low,close", file=cur_file)
-        ln = ",".join([str(time), *ohlc])
-        print(ln, file=cur_file)
-    if cur_file:
-        cur_file.close()
+        yield (time, *ohlc)
+
+
+def write_runs(rows: Iterable[tuple], chunk_size: int, tmpdir: str) -> list[str]:
+    """Sorts rows chunk_size at a time into files, which are each sorted."""
+    runs = []
+    rows = iter(rows)
+    while chunk := list(itertools.islice(rows, chunk_size)):
+        # sort is stable, so within a chunk the first row of a time stays first
+        chunk.sort(key=lambda row: row[0])
+        fname = os.path.join(tmpdir, f"run{len(runs)}.csv")
+        with open(fname, "w") as f:
+            for row in chunk:
+                print(",".join(map(str, row)), file=f)
+        runs.append(fname)
+    return runs
+
+
+def merge_runs(runs: list[str]) -> Iterator[tuple]:
+    """The rows of all runs in time order, keeping only the first of a time.
+
+    Rows of earlier runs come first among equal times, so the row kept is the
+    one that came first in the input.
+    """
+    files = [open(fname) for fname in runs]
+    try:
+        merged = heapq.merge(
+            *[((row[0], i, row) for row in parse_rows(f)) for i, f in enumerate(files)]
+        )
+        last_time = None
+        for time, _, row in merged:
+            if time != last_time:
+                last_time = time
+                yield row
+    finally:
+        for f in files:
+            f.close()
+
+
+def read_day_index(fname: str) -> list[int]:
+    """The timestamps already in a daily file, in file order."""
+    if not os.path.exists(fname):
+        return []
+    with open(fname) as f:
+        return [row[0] for row in parse_rows(f)]
+
+
+def merge_day(fname: str, rows: list[tuple]) -> int:
+    """Adds the rows whose timestamps fname does not have yet.
+
+    New rows after the last existing one are appended, which is the nightly
+    case. A backfill of older timestamps rewrites the file in order instead,
+    since the daily files must stay sorted. Returns the number of rows added.
+    """
+    index = read_day_index(fname)
+    known = set(index)
+    rows = [row for row in rows if row[0] not in known]
+    if not rows:
+        return 0
+    if not index:
+        with open(fname, "w") as f:
+            print(HEADER, file=f)
+            for row in rows:
+                print(",".join(map(str, row)), file=f)
+    elif rows[0][0] > index[-1]:
+        with open(fname, "a") as f:
+            for row in rows:
+                print(",".join(map(str, row)), file=f)
+    else:
+        with open(fname) as f:
+            existing = list(parse_rows(f))
+        tmp_fname = f"{fname}.{os.getpid()}.tmp"
+        with open(tmp_fname, "w") as f:
+            print(HEADER, file=f)
+            for row in heapq.merge(existing, rows, key=lambda row: row[0]):
+                print(",".join(map(str, row)), file=f)
+        os.replace(tmp_fname, fname)
+    return len(rows)
+
+
+@click.command()
+@click.argument("input", type=click.File("r"))
+@click.option("--data-dir", default="data")
+@click.option("--chunk-size", default=1_000_000, help="Rows sorted in memory at once.")
+def main(input, data_dir, chunk_size):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        runs = write_runs(parse_rows(input), chunk_size, tmpdir)
+        rows = merge_runs(runs)
+        days = itertools.groupby(
+            rows, key=lambda row: datetime.utcfromtimestamp(row[0]).date()
+        )
+        for cur_date, day_rows in days:
+            fname = os.path.join(data_dir, cur_date.strftime("%Y-%m-%d.csv"))
+            added = merge_day(fname, list(day_rows))
+            if added:
+                print(f"{fname}: {added} new rows")
 
 
 main()
@@ -0,0 +1,49 @@
+#!python3
+import asyncio
+import math
+import time
+import click
+from mytrade.streaming import replay_day, run_stream_async
+from trade import PERIOD, WHMA_PARAMS
+
+
+async def feed(queue: asyncio.Queue, file: str, delay: float, timeframe):
+    for bar in replay_day(file, timeframe=timeframe):
+        await queue.put(bar)
+        await asyncio.sleep(delay)
+    await queue.put(None)
+
+
+async def trade_live(file: str, delay: float, whma_sequence: list[int], timeframe):
+    queue = asyncio.Queue()
+    producer = asyncio.create_task(feed(queue, file, delay, timeframe))
+    decision = None
+    bars = 0
+    started = time.perf_counter()
+    async for decision in run_stream_async(
+        queue, whma_params=WHMA_PARAMS, period=PERIOD, whma_sequence=whma_sequence
+    ):
+        bars += 1
+        if not math.isnan(decision.buy_price):
+            print(f"{decision.time} buy  {decision.buy_price}")
+        if not math.isnan(decision.sell_price):
+            print(f"{decision.time} sell {decision.sell_price} {decision.gross_profit}")
+    await producer
+    latency = (time.perf_counter() - started - bars * delay) / max(bars, 1)
+    if decision:
+        print(f"score {decision.gross_profit + decision.position_value}")
+    print(f"{bars} bars, {1000 * latency:.3f} ms per bar")
+
+
+@click.command()
+@click.option("--replay", "file", default="./data/2022-09-09.csv")
+@click.option("--delay", default=0.0, help="Seconds between replayed bars.")
+@click.option("--sequence", default="", help="WHMA indexes to follow, e.g. 3,7,11")
+@click.option("--timeframe", type=int, default=None, help="Bar size in minutes.")
+def main(file, delay, sequence, timeframe):
+    whma_sequence = [int(x) for x in sequence.split(",") if x]
+    asyncio.run(trade_live(file, delay, whma_sequence, timeframe))
+
+
+if __name__ == "__main__":
+    main()
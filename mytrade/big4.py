@@ -34,3 +34,115 @@ def big4(line, ago: int) -> Tuple[float, float, float, float]:
     _jerk = scale * jerk(line, ago)
     _jounce = scale * jounce(line, ago)
     return _speed, _accel, _jerk, _jounce
+
+
+# Bars of each derivative a memo keeps. big4(-1) reads back 16 bars.
+MEMO_SIZE = 32
+
+
+class _MemoRing:
+    """Values of the last MEMO_SIZE absolute indexes, each in slot index % size."""
+
+    __slots__ = ("indexes", "values")
+
+    def __init__(self) -> None:
+        self.indexes = [-1] * MEMO_SIZE
+        self.values = [math.nan] * MEMO_SIZE
+
+    def slot(self, index: int) -> int:
+        return index % MEMO_SIZE
+
+
+class _MemoHistory:
+    """Values of every absolute index read so far, each in slot index."""
+
+    __slots__ = ("indexes", "values")
+
+    def __init__(self) -> None:
+        self.indexes: list[int] = []
+        self.values: list[float] = []
+
+    def slot(self, index: int) -> int:
+        if index >= len(self.indexes):
+            grow = index + 1 - len(self.indexes)
+            self.indexes.extend([-1] * grow)
+            self.values.extend([math.nan] * grow)
+        return index
+
+
+class Big4Memo:
+    """big4() of one line with every derivative memoized per bar.
+
+    Values are keyed by the absolute array index they are read at, so each
+    derivative is computed once per bar and reused by every later call at any
+    ago. Indexes whose window reaches below bar 1 read wrapped or missing data
+    and are always recomputed. Only the last MEMO_SIZE indexes are kept, which
+    covers every read of a line that moves forward bar by bar, so the memo
+    does not grow with the number of bars.
+
+    With history, every index is kept instead, for a memo shared by readers
+    that each sweep the whole line in turn, as runonce computes indicators.
+    """
+
+    def __init__(self, line, *, history: bool = False) -> None:
+        self.line = line
+        memo_cls = _MemoHistory if history else _MemoRing
+        self.__speed = memo_cls()
+        self.__accel = memo_cls()
+        self.__jerk = memo_cls()
+        self.__jounce = memo_cls()
+
+    def speed(self, ago: int) -> float:
+        index = self.line.idx + ago
+        if index < 1:
+            return speed(self.line, ago)
+        memo = self.__speed
+        slot = memo.slot(index)
+        if memo.indexes[slot] != index:
+            memo.values[slot] = speed(self.line, ago)
+            memo.indexes[slot] = index
+        return memo.values[slot]
+
+    def accel(self, ago: int) -> float:
+        index = self.line.idx + ago
+        if index < 3:
+            return accel(self.line, ago)
+        memo = self.__accel
+        slot = memo.slot(index)
+        if memo.indexes[slot] != index:
+            a0, a1 = self.speed(ago - 2), self.speed(ago)
+            memo.values[slot] = (a1 - a0) / 2
+            memo.indexes[slot] = index
+        return memo.values[slot]
+
+    def jerk(self, ago: int) -> float:
+        index = self.line.idx + ago
+        if index < 7:
+            return jerk(self.line, ago)
+        memo = self.__jerk
+        slot = memo.slot(index)
+        if memo.indexes[slot] != index:
+            a0, a1 = self.accel(ago - 4), self.accel(ago)
+            memo.values[slot] = (a1 - a0) / 4
+            memo.indexes[slot] = index
+        return memo.values[slot]
+
+    def jounce(self, ago: int) -> float:
+        index = self.line.idx + ago
+        if index < 15:
+            return jounce(self.line, ago)
+        memo = self.__jounce
+        slot = memo.slot(index)
+        if memo.indexes[slot] != index:
+            a0, a1 = self.jerk(ago - 8), self.jerk(ago)
+            memo.values[slot] = (a1 - a0) / 8
+            memo.indexes[slot] = index
+        return memo.values[slot]
+
+    def big4(self, ago: int) -> Tuple[float, float, float, float]:
+        scale = 100
+        _speed = scale * self.speed(ago)
+        _accel = scale * self.accel(ago)
+        _jerk = scale * self.jerk(ago)
+        _jounce = scale * self.jounce(ago)
+        return _speed, _accel, _jerk, _jounce
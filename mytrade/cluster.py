@@ -0,0 +1,159 @@
+import itertools
+from multiprocessing import Process
+from multiprocessing.managers import BaseManager, DictProxy
+import os
+import queue
+import secrets
+import threading
+import traceback
+from typing import Callable, Iterable, Iterator, Optional
+import dill
+
+
+class _QueueManager(BaseManager):
+    pass
+
+
+_QueueManager.register("tasks")
+_QueueManager.register("results")
+_QueueManager.register("functions", proxytype=DictProxy)
+
+
+def parse_address(address: str) -> tuple[str, int]:
+    host, port = address.rsplit(":", 1)
+    return host, int(port)
+
+
+def generate_authkey() -> str:
+    """A random key for a coordinator and its workers to authenticate with.
+
+    The connections carry pickled tasks and dill-pickled functions, which
+    anyone who holds the key can make a worker or the coordinator run.
+    """
+    return secrets.token_hex(16)
+
+
+class Coordinator:
+    """Hands out the tasks of imap() calls to workers over a socket.
+
+    Workers connect with run_worker() from any machine that can reach the
+    address and has the same checkout and data files. Each imap() call splits
+    its tasks into shards, and workers send every result back as soon as it
+    is done, so results stream in while slower shards are still running.
+
+    The function of a call is pickled with dill once per call rather than with
+    every task, and workers keep the last one they loaded. Whoever knows the
+    authkey can run code on the coordinator and on every worker, so it must
+    be kept secret when the address is reachable from other machines.
+    """
+
+    def __init__(
+        self,
+        address: tuple[str, int] = ("127.0.0.1", 0),
+        *,
+        authkey: bytes,
+        n_shards: int = 64,
+    ) -> None:
+        self.n_shards = n_shards
+        self.__tasks = queue.Queue()
+        self.__results = queue.Queue()
+        self.__functions = {}
+        # register() changes the class, so every coordinator gets its own
+        class Manager(BaseManager):
+            pass
+
+        Manager.register("tasks", callable=lambda: self.__tasks)
+        Manager.register("results", callable=lambda: self.__results)
+        Manager.register(
+            "functions", callable=lambda: self.__functions, proxytype=DictProxy
+        )
+        self.__server = Manager(address=address, authkey=authkey).get_server()
+        self.address = self.__server.address
+        self.authkey = authkey
+        self.__calls = itertools.count()
+        threading.Thread(target=self.__server.serve_forever, daemon=True).start()
+
+    def imap(self, fn: Callable, iterable: Iterable) -> Iterator:
+        """Like pathos' uimap, with results in the order they finish."""
+        call_id = next(self.__calls)
+        tasks = list(enumerate(iterable))
+        self.__functions[call_id] = dill.dumps(fn)
+        shard_size = max(1, -(-len(tasks) // self.n_shards))
+        for i in range(0, len(tasks), shard_size):
+            self.__tasks.put((call_id, tasks[i : i + shard_size]))
+        try:
+            pending = len(tasks)
+            while pending:
+                result_call_id, _, error, result = self.__results.get()
+                # late results of an abandoned call are dropped
+                if result_call_id != call_id:
+                    continue
+                if error:
+                    raise RuntimeError(f"task failed on a worker:\n{result}")
+                pending -= 1
+                yield result
+        finally:
+            del self.__functions[call_id]
+
+    def stop(self, n_workers: int):
+        """Tells n_workers to exit once the queued shards are done."""
+        for _ in range(n_workers):
+            self.__tasks.put(None)
+
+
+def run_worker(address: tuple[str, int], authkey: bytes):
+    """Evaluates shards from a Coordinator until it tells this worker to stop."""
+    manager = _QueueManager(address=address, authkey=authkey)
+    manager.connect()
+    tasks, results, functions = manager.tasks(), manager.results(), manager.functions()
+    loaded_call_id, fn = None, None
+    try:
+        while (shard := tasks.get()) is not None:
+            call_id, items = shard
+            if call_id != loaded_call_id:
+                pickled = functions.get(call_id)
+                if pickled is None:
+                    # a leftover shard of an abandoned call, whose results
+                    # the coordinator would drop anyway
+                    continue
+                loaded_call_id, fn = call_id, dill.loads(pickled)
+            for i, args in items:
+                try:
+                    results.put((call_id, i, False, fn(args)))
+                except Exception:
+                    results.put((call_id, i, True, traceback.format_exc()))
+    except (EOFError, ConnectionError):
+        # the coordinator exited without stopping its remote workers
+        pass
+
+
+class LocalCluster:
+    """A Coordinator with n_workers worker processes on this machine.
+
+    Runs the same protocol as a multi-node setup, which makes it the stand-in
+    for testing one on a single box. Its workers are its own children, so it
+    authenticates them with a fresh random key.
+    """
+
+    def __init__(self, n_workers: Optional[int] = None, **kwargs) -> None:
+        self.n_workers = n_workers or os.cpu_count()
+        kwargs.setdefault("authkey", generate_authkey().encode())
+        self.coordinator = Coordinator(**kwargs)
+        self.__workers = [
+            Process(
+                target=run_worker,
+                args=(self.coordinator.address, self.coordinator.authkey),
+                daemon=True,
+            )
+            for _ in range(self.n_workers)
+        ]
+
+    def __enter__(self) -> Coordinator:
+        for worker in self.__workers:
+            worker.start()
+        return self.coordinator
+
+    def __exit__(self, *exc) -> None:
+        self.coordinator.stop(self.n_workers)
+        for worker in self.__workers:
+            worker.join()
@@ -0,0 +1,133 @@
+import os
+from typing import Optional
+import numpy as np
+import pandas as pd
+
+
+COLUMNS = ("open", "high", "low", "close")
+CACHE_DIR = ".cache"
+# Copies of a day's first bar that lead it, so that its Hull averages are
+# warm by the first real bar.
+WARMUP = 24
+
+
+def cache_path(filepath: str, timeframe: Optional[int] = None) -> str:
+    """Where the binary copy of data/YYYY-MM-DD.csv lives.
+
+    Each timeframe, in minutes, is cached in its own file.
+    """
+    dirname, basename = os.path.split(filepath)
+    stem, _ = os.path.splitext(basename)
+    suffix = f".{timeframe}m.npy" if timeframe else ".npy"
+    return os.path.join(dirname, CACHE_DIR, stem + suffix)
+
+
+def load_day(filepath: str, timeframe: Optional[int] = None) -> pd.DataFrame:
+    """OHLC bars of one daily csv file indexed by their UTC time.
+
+    The csv is parsed once into a columnar .npy file with one row for the
+    unix time and one per price column. Later loads memory-map that file. The
+    cache is rebuilt whenever the csv's mtime no longer matches its own.
+
+    With a timeframe in minutes, the bars are resampled() to it and that
+    result is cached the same way, so it is aggregated only once per day.
+    """
+    columns = _load_columns(filepath, timeframe)
+    index = pd.to_datetime(columns[0].astype(np.int64), unit="s", utc=True)
+    return pd.DataFrame(columns[1:].T, index=index, columns=COLUMNS)
+
+
+def bar_interval(df: pd.DataFrame) -> pd.Timedelta:
+    """The bar size of a day, which gaps between bars can only widen."""
+    return pd.Timedelta(np.diff(df.index.asi8).min(), unit="ns")
+
+
+# Positions are closed from 19:50 UTC on, before the market closes at 20:00.
+EXIT_MINUTE = 19 * 60 + 50
+CLOSE_MINUTE = 20 * 60
+
+
+def closing_bars(time, interval: pd.Timedelta):
+    """Whether positions must be closed on the bar that starts at time.
+
+    Bars are labelled by their start, so a coarse bar like the 19:45 one of
+    15m bars starts before 19:50 and still is the last one of the day. A bar
+    is closing once it starts at 19:50 or later, or when it ends at the
+    close. time is a datetime, or a DatetimeIndex for an array of flags.
+    """
+    minute = time.hour * 60 + time.minute
+    end = minute + interval / pd.Timedelta(minutes=1)
+    closing = (minute >= EXIT_MINUTE) | (end >= CLOSE_MINUTE)
+    return np.asarray(closing) if isinstance(time, pd.Index) else bool(closing)
+
+
+def resample(columns: np.ndarray, timeframe: int) -> np.ndarray:
+    """Aggregates the (time, open, high, low, close) rows into timeframe bars.
+
+    Bars are aligned to multiples of the timeframe in unix time. A bar with
+    no source bars in it is a gap, and is filled with a flat bar at the
+    previous close so that the bars stay evenly spaced. Only multiples of
+    the source bar size can be built.
+    """
+    seconds = timeframe * 60
+    times, opens, highs, lows, closes = columns
+    base = np.diff(times).min() if len(times) > 1 else seconds
+    if seconds % base:
+        raise ValueError(
+            f"cannot build {timeframe}m bars out of {int(base) // 60}m bars"
+        )
+    bucket = times // seconds * seconds
+    starts = np.flatnonzero(np.r_[True, np.diff(bucket) != 0])
+    ends = np.r_[starts[1:], len(times)] - 1
+
+    grid = np.arange(bucket[0], bucket[-1] + seconds, seconds)
+    present = np.searchsorted(grid, bucket[starts])
+    out = np.empty((len(COLUMNS) + 1, len(grid)))
+    out[0] = grid
+    # index of the last bar at or before each grid bar, to fill the gaps
+    last = np.zeros(len(grid), dtype=np.int64)
+    last[present] = np.arange(len(starts))
+    last = np.maximum.accumulate(last)
+    filled = np.ones(len(grid), dtype=bool)
+    filled[present] = False
+    out[4] = closes[ends][last]
+    out[1] = np.where(filled, out[4], opens[starts][last])
+    out[2] = np.where(filled, out[4], np.maximum.reduceat(highs, starts)[last])
+    out[3] = np.where(filled, out[4], np.minimum.reduceat(lows, starts)[last])
+    return out
+
+
+def _load_columns(filepath: str, timeframe: Optional[int]) -> np.ndarray:
+    cache_file = cache_path(filepath, timeframe)
+    mtime_ns = os.stat(filepath).st_mtime_ns
+    try:
+        if os.stat(cache_file).st_mtime_ns != mtime_ns:
+            raise FileNotFoundError(cache_file)
+        return np.load(cache_file, mmap_mode="r")
+    except (FileNotFoundError, ValueError):
+        if timeframe:
+            columns = resample(_load_columns(filepath, None), timeframe)
+        else:
+            columns = _read_csv(filepath)
+        _write_cache(cache_file, columns, mtime_ns)
+        return columns
+
+
+def _read_csv(filepath: str) -> np.ndarray:
+    df = pd.read_csv(filepath, index_col="time")
+    assert tuple(df.columns) == COLUMNS, f"unexpected columns in {filepath}"
+    columns = np.empty((len(COLUMNS) + 1, df.shape[0]))
+    columns[0] = df.index.to_numpy()
+    columns[1:] = df.to_numpy(dtype=float).T
+    return columns
+
+
+def _write_cache(cache_file: str, columns: np.ndarray, mtime_ns: int):
+    # Written under a temporary name first so that concurrent workers never
+    # map a half-written file.
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    with open(tmp_file, "wb") as f:
+        np.save(f, columns)
+    os.utime(tmp_file, ns=(mtime_ns, mtime_ns))
+    os.replace(tmp_file, cache_file)
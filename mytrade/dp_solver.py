@@ -0,0 +1,71 @@
+import math
+from typing import Tuple
+import numpy as np
+
+
+def solve_whma_sequence(
+    opentrades: np.ndarray, ohlc4: np.ndarray, *, period: int
+) -> Tuple[float, list[int]]:
+    """Finds the whma_sequence maximizing WHMASelector.get_score().
+
+    opentrades has one row per WHMA (e.g. WHMABank.opentrades). Between
+    periods the selector only carries whether it is flat or long and, when
+    long, the bar it bought at, since the entry price is that bar's ohlc4.
+    Keeping the best gross profit per such state over all periods is exact and
+    costs O(periods * bars * whmas * period).
+
+    Returns (score, path), where path has one WHMA index per period and
+    replaying it with run_once(greedy=False) yields the same score.
+    """
+    n_whmas, n_bars = opentrades.shape
+    num_periods = math.ceil(n_bars / period)
+    whmas = np.arange(n_whmas)
+
+    # state 0 is flat, state 1 + b is long since a buy at bar b
+    states = np.array([0])
+    gross = np.array([0.0])
+    amount = np.array([0.0])
+    backpointers = []
+    for period_index in range(num_periods):
+        start = period_index * period
+        entry = np.broadcast_to((states - 1)[:, None], (len(states), n_whmas)).copy()
+        n_opentrades = np.broadcast_to(amount[:, None], entry.shape).copy()
+        n_gross = np.broadcast_to(gross[:, None], entry.shape).copy()
+        for bar_index in range(start, min(n_bars, start + period)):
+            price = ohlc4[bar_index]
+            target = opentrades[:, bar_index][None, :]
+            buying = (target > n_opentrades) & (n_opentrades == 0)
+            selling = ~buying & (target < n_opentrades) & (n_opentrades > 0)
+            profit = (price - ohlc4[np.maximum(entry, 0)]) * n_opentrades
+            n_gross = np.where(selling, n_gross + profit, n_gross)
+            n_opentrades = np.where(
+                buying, target, np.where(selling, 0.0, n_opentrades)
+            )
+            entry = np.where(buying, bar_index, entry)
+
+        # keep the best candidate for every state reached by this period
+        next_states = np.where(n_opentrades > 0, entry + 1, 0).ravel()
+        order = np.lexsort((-n_gross.ravel(), next_states))
+        next_states = next_states[order]
+        first = np.flatnonzero(np.diff(next_states, prepend=-1))
+        best = order[first]
+        backpointers.append(
+            (states[best // n_whmas], whmas[best % n_whmas], next_states[first])
+        )
+        states = next_states[first]
+        gross = n_gross.ravel()[best]
+        amount = n_opentrades.ravel()[best]
+
+    price = ohlc4[n_bars - 1]
+    entry_price = np.where(states > 0, ohlc4[np.maximum(states - 1, 0)], 0.0)
+    scores = amount * (price - entry_price) + gross
+    best = int(np.argmax(scores))
+
+    path = []
+    state = states[best]
+    for prev_states, choices, reached in reversed(backpointers):
+        i = int(np.searchsorted(reached, state))
+        path.append(int(choices[i]))
+        state = prev_states[i]
+    path.reverse()
+    return float(scores[best]), path
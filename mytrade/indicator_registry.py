@@ -0,0 +1,73 @@
+from typing import Any
+import backtrader as bt
+from .big4 import Big4Memo
+
+
+class Ohlc4(bt.Indicator):
+    """(open + high + low + close) / 4 of a data feed."""
+
+    lines = ("ohlc4",)
+    plotinfo = {"plot": False}
+
+    def __init__(self):
+        self.l.ohlc4 = (
+            self.data.open + self.data.high + self.data.low + self.data.close
+        ) / 4
+
+
+def release_intermediates(indicator) -> None:
+    """Frees the lines of everything an indicator computed its own lines from.
+
+    Only for runonce, where the indicator's lines are final once computed and
+    its sub-indicators are never read again.
+    """
+    for sub in getattr(indicator, "_lineiterators", {}).get(bt.Indicator.IndType, []):
+        release_intermediates(sub)
+        for line in sub.lines:
+            line.reset()
+
+
+class IndicatorRegistry:
+    """Builds each distinct indicator once and hands it to every caller.
+
+    Indicators are keyed by (source line, indicator class, params), so the
+    WeightedHMAs of a grid share one ohlc4 and one HullMovingAverage per
+    distinct period instead of each building their own, and one Big4Memo of
+    each Hull average's line. The indicators are
+    owned by whoever calls the registry, which must be the strategy for them
+    to be computed once before all of their users.
+    """
+
+    def __init__(self) -> None:
+        # the source is kept next to its indicator so that its id stays unique
+        self.__indicators: dict[tuple, tuple[Any, bt.Indicator]] = {}
+        self.__big4: dict[int, Big4Memo] = {}
+        self.requested = 0
+
+    def __len__(self) -> int:
+        return len(self.__indicators)
+
+    def get(self, cls: type, source, **params) -> bt.Indicator:
+        self.requested += 1
+        key = (id(source), cls, tuple(sorted(params.items())))
+        if key not in self.__indicators:
+            self.__indicators[key] = source, cls(source, plot=False, **params)
+        return self.__indicators[key][1]
+
+    def ohlc4(self, data) -> Ohlc4:
+        return self.get(Ohlc4, data)
+
+    def hma(self, data, period: int) -> bt.ind.HullMovingAverage:
+        """HullMovingAverage of the ohlc4 of data."""
+        return self.get(bt.ind.HullMovingAverage, self.ohlc4(data), period=period)
+
+    def big4(self, line) -> Big4Memo:
+        """The Big4Memo of line, which keeps every bar for all of its readers."""
+        if id(line) not in self.__big4:
+            self.__big4[id(line)] = Big4Memo(line, history=True)
+        return self.__big4[id(line)]
+
+    def release_intermediates(self) -> None:
+        """release_intermediates() of every indicator, once all are computed."""
+        for source, indicator in self.__indicators.values():
+            release_intermediates(indicator)
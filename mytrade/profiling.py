@@ -0,0 +1,122 @@
+from collections import defaultdict
+from contextlib import contextmanager
+import json
+import time
+from typing import Callable, Iterable, Iterator
+
+
+# name -> [seconds, calls], for this process only until merged by the parent
+_stats: dict[str, list[float]] = defaultdict(lambda: [0.0, 0])
+_enabled = False
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable():
+    """Turns on phase timing and times next() of the per-bar classes."""
+    global _enabled
+    _enabled = True
+    # imported here since these modules import this one through pandadata
+    from .selector_observer import SelectorObserver
+    from .weighted_hma import HeadlessWeightedHMA
+    from .whma_selector import HeadlessWHMASelector
+
+    # next() lives on the headless base classes, which the full ones inherit
+    _patch(HeadlessWeightedHMA, "next", "WeightedHMA.next")
+    _patch(HeadlessWHMASelector, "next", "WHMASelector.next")
+    _patch(SelectorObserver, "next", "SelectorObserver.next")
+
+
+def record(name: str, seconds: float, calls: int = 1):
+    entry = _stats[name]
+    entry[0] += seconds
+    entry[1] += calls
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    if not _enabled:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+
+def _patch(cls, method: str, name: str):
+    original = cls.__dict__[method]
+    if getattr(original, "_profiled", False):
+        return
+
+    def wrapper(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return original(self, *args, **kwargs)
+        finally:
+            record(name, time.perf_counter() - started)
+
+    wrapper._profiled = True
+    setattr(cls, method, wrapper)
+
+
+def worker_task(fn: Callable) -> Callable:
+    """Makes fn return its result together with the timings it caused.
+
+    The returned task runs in pool workers, whose timings would otherwise
+    stay in the worker process. Pair with merge_results() in the parent.
+    """
+    if not _enabled:
+        return fn
+
+    def task(args):
+        enable()
+        _stats.clear()
+        with phase("task"):
+            result = fn(args)
+        stats = {k: tuple(v) for k, v in _stats.items()}
+        _stats.clear()
+        return result, stats
+
+    return task
+
+
+def merge_results(results: Iterable) -> Iterator:
+    if not _enabled:
+        yield from results
+        return
+    for result, stats in results:
+        for name, (seconds, calls) in stats.items():
+            record(name, seconds, calls)
+        yield result
+
+
+def report(wall: float) -> dict:
+    return {
+        "wall": wall,
+        "phases": {
+            name: {"seconds": seconds, "calls": calls}
+            for name, (seconds, calls) in sorted(
+                _stats.items(), key=lambda x: x[1][0], reverse=True
+            )
+        },
+    }
+
+
+def print_report(wall: float):
+    print(f"{'phase':<24} {'calls':>9} {'total s':>10} {'mean ms':>10} {'% wall':>8}")
+    for name, entry in report(wall)["phases"].items():
+        seconds, calls = entry["seconds"], entry["calls"]
+        print(
+            f"{name:<24} {calls:>9} {seconds:>10.3f} "
+            f"{1000 * seconds / calls:>10.3f} {100 * seconds / wall:>7.1f}%"
+        )
+    print("Phases nest, and worker times are summed over all pool processes.")
+
+
+def dump(path: str, wall: float):
+    with open(path, "w") as f:
+        json.dump(report(wall), f, indent=2)
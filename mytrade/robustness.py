@@ -0,0 +1,152 @@
+from dataclasses import dataclass
+from typing import Sequence
+import numpy as np
+import pandas as pd
+from .data_cache import WARMUP
+from .whma_engine import ohlc4
+from .whma_selector import step_candidates
+
+
+@dataclass(frozen=True, kw_only=True, slots=True)
+class SimulatedDays:
+    """Price paths derived from one day's bars, one simulation per row.
+
+    Each row is led by the same warmup padding as PandasData, a flat repeat
+    of its first bar, so that its bars line up with the original df.
+    """
+
+    ohlc4: np.ndarray
+    close: np.ndarray
+
+    def __len__(self) -> int:
+        return self.ohlc4.shape[0]
+
+
+def _pad(values: np.ndarray, warmup: int) -> np.ndarray:
+    return np.concatenate([np.repeat(values[:, :1], warmup, axis=1), values], axis=1)
+
+
+def block_bootstrap(
+    df: pd.DataFrame,
+    n_sims: int,
+    *,
+    block: int,
+    warmup: int = WARMUP,
+    rng: np.random.Generator,
+) -> SimulatedDays:
+    """Days rebuilt from blocks of the original bars drawn with replacement.
+
+    Every bar after the first is a move: its close's log return from the
+    previous close, and where its ohlc4 sits relative to its close. Each
+    simulation chains block consecutive moves from random starts, wrapping
+    around the end of the day, from the first bar's close. df is the frame
+    of PandasData, led by warmup padding bars.
+    """
+    price, close = ohlc4(df)[warmup:], df["close"].to_numpy(dtype=float)[warmup:]
+    n_moves = close.shape[0] - 1
+    returns = np.diff(np.log(close))
+    shapes = price[1:] / close[1:]
+
+    n_blocks = -(-n_moves // block)
+    starts = rng.integers(0, n_moves, size=(n_sims, n_blocks))
+    moves = (starts[:, :, None] + np.arange(block)) % n_moves
+    moves = moves.reshape(n_sims, -1)[:, :n_moves]
+
+    sim_close = np.empty((n_sims, n_moves + 1))
+    sim_close[:, 0] = close[0]
+    sim_close[:, 1:] = close[0] * np.exp(np.cumsum(returns[moves], axis=1))
+    sim_price = np.empty_like(sim_close)
+    sim_price[:, 0] = price[0]
+    sim_price[:, 1:] = sim_close[:, 1:] * shapes[moves]
+    return SimulatedDays(ohlc4=_pad(sim_price, warmup), close=_pad(sim_close, warmup))
+
+
+def price_noise(
+    df: pd.DataFrame,
+    n_sims: int,
+    *,
+    scale: float,
+    warmup: int = WARMUP,
+    rng: np.random.Generator,
+) -> SimulatedDays:
+    """The original bars with every bar's prices scaled by lognormal noise.
+
+    The noise of a bar moves its ohlc4 and close by the same factor, with a
+    standard deviation of scale times the std of the day's close returns.
+    """
+    price, close = ohlc4(df)[warmup:], df["close"].to_numpy(dtype=float)[warmup:]
+    sigma = scale * np.std(np.diff(np.log(close)))
+    factor = np.exp(rng.normal(0, sigma, size=(n_sims, close.shape[0])))
+    return SimulatedDays(
+        ohlc4=_pad(price * factor, warmup), close=_pad(close * factor, warmup)
+    )
+
+
+def _targets(opentrades: np.ndarray, choices: np.ndarray, lo: int, hi: int):
+    """opentrades[s, choices[s], lo:hi] of every simulation s, 0 for a -1."""
+    rows = opentrades[np.arange(opentrades.shape[0]), np.maximum(choices, 0), lo:hi]
+    return np.where((choices == -1)[:, None], 0, rows)
+
+
+def path_scores(
+    opentrades: np.ndarray, price: np.ndarray, path: Sequence[int], *, period: int
+) -> np.ndarray:
+    """replay_path() score of one WHMA sequence on every simulation at once.
+
+    opentrades has shape (n_sims, n_whmas, n_bars), like the result of
+    compute_whma_opentrades(), and price the ohlc4 of each simulation.
+    """
+    n_sims, n_whmas, n_bars = opentrades.shape
+    n_bars = min(n_bars, len(path) * period)
+    choices = np.repeat(np.asarray(path, dtype=int), period)[:n_bars]
+    # a choice of -1 sells, like a selector told to stay out of the market
+    targets = opentrades[:, np.maximum(choices, 0), np.arange(n_bars)]
+    targets = np.where(choices == -1, 0, targets)
+    gross_profit, _, _, position_value = step_candidates(
+        targets, price[:, :n_bars], gross_profit=0, opentrades=0, opentrade_price=0
+    )
+    return gross_profit + position_value
+
+
+def policy_scores(
+    opentrades: np.ndarray,
+    price: np.ndarray,
+    *,
+    period: int,
+    whma_sequence: Sequence[int] = (),
+) -> np.ndarray:
+    """StreamingSelector score on every simulation at once.
+
+    Each period follows whma_sequence while it lasts, and after that runs the
+    WHMA that would have scored best over the previous period, picked for
+    every simulation separately.
+    """
+    n_sims, n_whmas, n_bars = opentrades.shape
+    state = (np.zeros(n_sims), np.zeros(n_sims), np.zeros(n_sims))
+    position_value = np.zeros(n_sims)
+    for period_index, lo in enumerate(range(0, n_bars, period)):
+        hi = min(n_bars, lo + period)
+        if period_index < len(whma_sequence):
+            choices = np.full(n_sims, whma_sequence[period_index])
+        elif period_index == 0:
+            choices = np.zeros(n_sims, dtype=int)
+        else:
+            gross_profit, n_opentrades, opentrade_price = period_start
+            candidate_profit, _, _, candidate_value = step_candidates(
+                opentrades[:, :, lo - period : lo],
+                price[:, None, lo - period : lo],
+                gross_profit=gross_profit[:, None],
+                opentrades=n_opentrades[:, None],
+                opentrade_price=opentrade_price[:, None],
+            )
+            choices = np.argmax(candidate_profit + candidate_value, axis=1)
+        period_start = state
+        gross_profit, n_opentrades, opentrade_price, position_value = step_candidates(
+            _targets(opentrades, choices, lo, hi),
+            price[:, lo:hi],
+            gross_profit=state[0],
+            opentrades=state[1],
+            opentrade_price=state[2],
+        )
+        state = (gross_profit, n_opentrades, opentrade_price)
+    return state[0] + position_value
@@ -0,0 +1,133 @@
+from dataclasses import dataclass
+import hashlib
+import os
+import pickle
+import sqlite3
+from typing import Callable, Optional, Sequence, Tuple
+from . import profiling
+from .data_cache import CACHE_DIR
+from .whma_selector import SelectorSnapshot
+
+
+DB_NAME = "scores.sqlite"
+MAX_ENTRIES = 1_000_000
+# Eviction runs once every this many inserts of a process, not on every insert
+EVICT_EVERY = 1000
+
+
+def file_digest(filepath: str) -> str:
+    with open(filepath, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+@dataclass(frozen=True, kw_only=True, slots=True)
+class ScoreCache:
+    """Picklable handle to the on-disk scores of one day's search.
+
+    Maps a WHMA path to the score and SelectorSnapshot eval_profit returned
+    for it. Entries are keyed by the content of the data file, the whma_params,
+    the period and the timeframe, so changing any of them never returns a
+    stale score.
+
+    The database lives next to the binary data cache and is shared by all
+    days and processes. Each process opens its own connection, and the WAL
+    journal lets the workers read while another one writes. Once the table
+    exceeds max_entries, the oldest inserts are evicted first.
+    """
+
+    db_path: str
+    key: str
+    max_entries: int = MAX_ENTRIES
+
+    @classmethod
+    def for_day(
+        cls,
+        filepath: str,
+        *,
+        whma_params,
+        period: int,
+        timeframe: Optional[int] = None,
+        max_entries=MAX_ENTRIES,
+    ) -> "ScoreCache":
+        params = [tuple(x) for x in whma_params]
+        key = f"{file_digest(filepath)}|{params}|{period}"
+        if timeframe:
+            key += f"|{timeframe}m"
+        key = hashlib.sha256(key.encode()).hexdigest()
+        db_path = os.path.join(os.path.dirname(filepath), CACHE_DIR, DB_NAME)
+        return cls(db_path=db_path, key=key, max_entries=max_entries)
+
+    def get(self, path: Sequence[int]) -> Optional[Tuple[float, SelectorSnapshot]]:
+        row = (
+            _connect(self.db_path)
+            .execute(
+                "SELECT score, snapshot FROM scores WHERE key = ?",
+                (self.__path_key(path),),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        score, snapshot = row
+        return score, pickle.loads(snapshot)
+
+    def put(self, path: Sequence[int], score: float, snapshot: SelectorSnapshot):
+        conn = _connect(self.db_path)
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO scores (key, score, snapshot) VALUES (?, ?, ?)",
+                (self.__path_key(path), score, pickle.dumps(snapshot)),
+            )
+        _inserts[self.db_path] = _inserts.get(self.db_path, 0) + 1
+        if _inserts[self.db_path] % EVICT_EVERY == 0:
+            self.evict()
+
+    def evict(self):
+        # INSERT OR REPLACE gives a rewritten key a new rowid, so the lowest
+        # rowids are always the oldest entries
+        conn = _connect(self.db_path)
+        with conn:
+            conn.execute(
+                "DELETE FROM scores WHERE rowid <= (SELECT MAX(rowid) FROM scores) - ?",
+                (self.max_entries,),
+            )
+
+    def __path_key(self, path: Sequence[int]) -> str:
+        return f"{self.key}:{' '.join(str(x) for x in path)}"
+
+
+# Connections opened by this process, which must never be inherited by a fork
+_connections: dict[Tuple[int, str], sqlite3.Connection] = {}
+_inserts: dict[str, int] = {}
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    key = os.getpid(), db_path
+    if key not in _connections:
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        conn = sqlite3.connect(db_path, timeout=60)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS scores"
+            " (key TEXT PRIMARY KEY, score REAL NOT NULL, snapshot BLOB NOT NULL)"
+        )
+        _connections[key] = conn
+    return _connections[key]
+
+
+def cached(eval_profit: Callable, cache: ScoreCache) -> Callable:
+    """Wraps eval_profit of trade.search_day() to look paths up in cache first."""
+
+    def eval_cached(args) -> tuple[float, list[int], SelectorSnapshot]:
+        path, snapshot = args
+        with profiling.phase("score cache"):
+            hit = cache.get(path)
+        if hit is not None:
+            score, snapshot = hit
+            return score, path, snapshot
+        score, path, snapshot = eval_profit(args)
+        cache.put(path, score, snapshot)
+        return score, path, snapshot
+
+    return eval_cached
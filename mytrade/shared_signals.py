@@ -0,0 +1,79 @@
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import Optional, Sequence, Tuple
+import numpy as np
+from .whma_selector import SelectorSnapshot, replay_path
+
+
+@dataclass(frozen=True, kw_only=True, slots=True)
+class SharedSignalsSpec:
+    """Picklable handle to a published signal matrix.
+
+    The block holds one row per WHMA opentrades line followed by the ohlc4
+    row, all as float64.
+    """
+
+    name: str
+    n_whmas: int
+    n_bars: int
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.n_whmas + 1, self.n_bars
+
+
+class SharedSignals:
+    """Publishes the opentrades and ohlc4 lines of a WHMABank to workers.
+
+    Used as a context manager in the parent process, which owns the block and
+    unlinks it on exit. Workers only ever receive the spec.
+    """
+
+    def __init__(self, opentrades: np.ndarray, ohlc4: np.ndarray) -> None:
+        n_whmas, n_bars = opentrades.shape
+        size = np.dtype(np.float64).itemsize * n_bars * (n_whmas + 1)
+        self.__shm = shared_memory.SharedMemory(create=True, size=size)
+        self.spec = SharedSignalsSpec(
+            name=self.__shm.name, n_whmas=n_whmas, n_bars=n_bars
+        )
+        matrix = np.ndarray(self.spec.shape, dtype=np.float64, buffer=self.__shm.buf)
+        matrix[:-1] = opentrades
+        matrix[-1] = ohlc4
+        del matrix
+
+    def __enter__(self) -> SharedSignalsSpec:
+        return self.spec
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        _attached.pop(self.spec.name, None)
+        self.__shm.close()
+        self.__shm.unlink()
+
+
+# Blocks attached by this process, kept open for the lifetime of the worker
+_attached: dict[str, Tuple[shared_memory.SharedMemory, np.ndarray]] = {}
+
+
+def attach(spec: SharedSignalsSpec) -> Tuple[np.ndarray, np.ndarray]:
+    """Zero-copy (opentrades, ohlc4) views of a published signal matrix."""
+    if spec.name not in _attached:
+        shm = shared_memory.SharedMemory(name=spec.name)
+        matrix = np.ndarray(spec.shape, dtype=np.float64, buffer=shm.buf)
+        matrix.flags.writeable = False
+        _attached[spec.name] = shm, matrix
+    shm, matrix = _attached[spec.name]
+    return matrix[:-1], matrix[-1]
+
+
+def score_path(
+    spec: SharedSignalsSpec,
+    path: Sequence[int],
+    *,
+    period: int,
+    snapshot: Optional[SelectorSnapshot] = None,
+) -> SelectorSnapshot:
+    opentrades, ohlc4 = attach(spec)
+    return replay_path(opentrades, ohlc4, path, period=period, snapshot=snapshot)
@@ -2,8 +2,9 @@ from datetime import datetime
 import math
 from typing import Iterable, Tuple
 import backtrader as bt
-from .weighted_hma import WeightedHMA
-from .whma_selector import WHMASelector
+from .indicator_registry import IndicatorRegistry
+from .weighted_hma import HeadlessWeightedHMA, WeightedHMA
+from .whma_selector import HeadlessWHMASelector, WHMASelector
 
 
 class DerStrategy(bt.Strategy):
@@ -13,6 +14,11 @@ class DerStrategy(bt.Strategy):
         ("partial_run", None),
         ("greedy", False),
         ("whma_params", []),
+        ("snapshot", None),
+        # Builds the selector and its WHMAs without plot-only lines.
+        ("headless", False),
+        # Headless only: keeps full history only in the lines the selector reads.
+        ("compact", False),
     ]
     # def log(self, txt, dt=None):
     #     """Logging function for this strategy"""
@@ -25,8 +31,13 @@ class DerStrategy(bt.Strategy):
 
         # https://github.com/verybadsoldier/backtrader_plotting/wiki
         self.whmas = []
+        whma_cls = HeadlessWeightedHMA if self.p.headless else WeightedHMA
+        # one ohlc4 and one Hull average per distinct period for all WHMAs
+        self.indicators = IndicatorRegistry()
         for h1, h2 in self.p.whma_params:
-            self.whmas.append(WeightedHMA(plot=False, h1=h1, h2=h2))
+            self.whmas.append(
+                whma_cls.shared(self.indicators, self.data, plot=False, h1=h1, h2=h2)
+            )
 
         # Additional parameters of backtrader_plotting are not recognized by
         # backtrader so they cannot be set manually.
@@ -41,13 +52,20 @@ class DerStrategy(bt.Strategy):
                 for path in generate_paths(whmas_count, periods_count - 1):
                     yield [i] + path
 
-        self.selector = WHMASelector(
+        if self.p.headless:
+            selector_cls, plot_params = HeadlessWHMASelector, {}
+        else:
+            selector_cls, plot_params = WHMASelector, {"display_plots": "price"}
+        self.selector = selector_cls(
+            self.data,
+            self.indicators.ohlc4(self.data),
             period=self.p.period,
-            display_plots="price",
             whmas=self.whmas,
             whma_sequence=self.p.whma_sequence,
             partial_run=self.p.partial_run,
             greedy=self.p.greedy,
+            snapshot=self.p.snapshot,
+            **plot_params,
         )
 
         # WHMASelector(subplot=True, display_plots="speed")
@@ -77,7 +95,34 @@ class DerStrategy(bt.Strategy):
 
         self.__curr_gear = self.__select_gear(self.__init_state())
 
+    def start(self):
+        if self.p.compact:
+            assert self.p.headless, "compact lines cannot be plotted"
+            # the rings of compact WHMAs are only moved right by runonce
+            env = self.env.p
+            assert (
+                env.runonce
+                and env.preload
+                and not env.exactbars
+                and not env.live
+                and not any(data.islive() or data.replaying for data in self.datas)
+            ), "compact lines need runonce with preloaded data"
+            for whma in self.whmas:
+                whma.compact()
+        self.__released = False
+
+    def prenext(self):
+        self.__release_intermediates()
+
+    def __release_intermediates(self):
+        # runonce has computed every indicator before the first bar of the
+        # strategy, so nothing reads what they were computed from any more
+        if self.p.compact and not self.__released:
+            self.indicators.release_intermediates()
+            self.__released = True
+
     def next(self):
+        self.__release_intermediates()
 
         # Simply log the closing price of the series from the reference
         # self.log("Close, %.2f" % self.dataclose[0])
@@ -0,0 +1,375 @@
+import asyncio
+from dataclasses import dataclass
+import datetime
+import math
+from typing import AsyncIterator, Iterable, Iterator, Optional, Sequence
+import numpy as np
+import pandas as pd
+from .data_cache import WARMUP, bar_interval, closing_bars, load_day
+from .whma_engine import (
+    BIG4_SCALE,
+    WHMAState,
+    step_whmas,
+    whma_minperiods,
+)
+from .whma_selector import compute_bar, score_candidates
+
+
+@dataclass(frozen=True, kw_only=True, slots=True)
+class Bar:
+    time: datetime.datetime
+    open: float
+    high: float
+    low: float
+    close: float
+
+
+@dataclass(frozen=True, kw_only=True, slots=True)
+class Decision:
+    """What the streaming selector did on one bar.
+
+    buy_price and sell_price are nan unless the bar traded.
+    """
+
+    time: datetime.datetime
+    price: float
+    active_whma_index: int
+    buy_price: float
+    sell_price: float
+    opentrades: int
+    gross_profit: float
+    position_value: float
+
+
+class Ring:
+    """The last size values pushed, newest at ago 0 like a backtrader line."""
+
+    __slots__ = ("__values", "__count")
+
+    def __init__(self, size: int) -> None:
+        self.__values = [math.nan] * size
+        self.__count = 0
+
+    def push(self, value: float):
+        self.__values[self.__count % len(self.__values)] = value
+        self.__count += 1
+
+    def __getitem__(self, ago: int) -> float:
+        """Values older than the ring or than the stream read as nan."""
+        if -ago >= min(self.__count, len(self.__values)):
+            return math.nan
+        return self.__values[(self.__count - 1 + ago) % len(self.__values)]
+
+    def __len__(self) -> int:
+        return min(self.__count, len(self.__values))
+
+    def window(self) -> list[float]:
+        """The buffered values from the oldest to the newest."""
+        return [self[ago] for ago in range(1 - len(self), 1)]
+
+
+class StreamingWMA:
+    """weighted_moving_average() of a stream, one value per push.
+
+    The window is summed with math.fsum like backtrader does, since a running
+    sum drifts and flips the sign of derivatives that are exactly 0.
+    """
+
+    def __init__(self, period: int) -> None:
+        self.period = period
+        self.__coef = 2.0 / (period * (period + 1.0))
+        self.__weights = range(1, period + 1)
+        self.__window = Ring(period)
+
+    def update(self, value: float) -> float:
+        # the source is nan until its own minperiod, and never after
+        if math.isnan(value) and not len(self.__window):
+            return math.nan
+        self.__window.push(value)
+        if len(self.__window) < self.period:
+            return math.nan
+        window = self.__window.window()
+        return self.__coef * math.fsum(w * x for w, x in zip(self.__weights, window))
+
+
+class StreamingHMA:
+    """hull_moving_average() and its big4 derivatives of a stream.
+
+    Each derivative keeps only as many bars as the next one reads back.
+    """
+
+    def __init__(self, period: int) -> None:
+        self.period = period
+        self.__wma = StreamingWMA(period)
+        self.__wma2 = StreamingWMA(period // 2)
+        self.__hull = StreamingWMA(int(pow(period, 0.5)))
+        self.hma = Ring(2)
+        self.speed = Ring(3)
+        self.accel = Ring(5)
+        self.jerk = Ring(9)
+        self.jounce = Ring(2)
+
+    def update(self, value: float) -> float:
+        wma = self.__wma.update(value)
+        wma2 = 2.0 * self.__wma2.update(value)
+        self.hma.push(self.__hull.update(wma2 - wma))
+        # each derivative is computed once per bar from the ones before it,
+        # with the same operands as mytrade.big4
+        self.speed.push(self.hma[0] - self.hma[-1])
+        self.accel.push((self.speed[0] - self.speed[-2]) / 2)
+        self.jerk.push((self.accel[0] - self.accel[-4]) / 4)
+        self.jounce.push((self.jerk[0] - self.jerk[-8]) / 8)
+        return self.hma[0]
+
+    def big4(self, ago: int) -> tuple[float, float, float, float]:
+        return (
+            BIG4_SCALE * self.speed[ago],
+            BIG4_SCALE * self.accel[ago],
+            BIG4_SCALE * self.jerk[ago],
+            BIG4_SCALE * self.jounce[ago],
+        )
+
+    def can_buy(self, ago: int) -> bool:
+        speed, accel, jerk, jounce = self.big4(ago)
+        return speed > 0 and accel > 0
+
+    def can_sell(self, ago: int) -> bool:
+        speed, accel, jerk, jounce = self.big4(ago)
+        return (
+            speed < 0
+            or speed + accel < 0
+            or speed + accel + jerk < 0
+            or speed + accel + jerk + jounce < 0
+        )
+
+
+class StreamingWHMABank:
+    """compute_whma_bank() for bars that arrive one at a time.
+
+    Every distinct Hull average is updated once per bar and shared by the
+    WeightedHMAs that use it. Memory does not grow with the number of bars.
+
+    Unlike a backtrader line, reads before the first bar are nan instead of
+    wrapping around to the end of the day, so the first few bars of a day
+    can decide differently from a batch run.
+    """
+
+    def __init__(
+        self,
+        whma_params: Sequence[tuple[int, int]],
+        *,
+        h3: int = 3,
+        stopprofit: float = 0.05,
+    ) -> None:
+        self.whma_params = [tuple(x) for x in whma_params]
+        self.stopprofit = stopprofit
+        periods = sorted({h for params in self.whma_params for h in params} | {h3})
+        self.__hmas = [StreamingHMA(h) for h in periods]
+        self.__h1 = np.array([periods.index(h1) for h1, _ in self.whma_params])
+        self.__h2 = np.array([periods.index(h2) for _, h2 in self.whma_params])
+        self.__h3 = np.full(len(self.whma_params), periods.index(h3))
+        self.__minperiods = whma_minperiods(self.whma_params, h3)
+        self.__bars = 0
+        # the bar size, as the smallest step between the bars seen so far
+        self.__last_time: Optional[datetime.datetime] = None
+        self.__interval = pd.Timedelta(0)
+        self.state = WHMAState.zeros(len(self.whma_params))
+
+    def update(self, bar: Bar) -> np.ndarray:
+        """Steps every WeightedHMA by one bar and returns their opentrades."""
+        if self.__last_time is not None:
+            step = pd.Timedelta(bar.time - self.__last_time)
+            if not self.__interval or step < self.__interval:
+                self.__interval = step
+        self.__last_time = bar.time
+        price = (bar.open + bar.high + bar.low + bar.close) / 4
+        for hma in self.__hmas:
+            hma.update(price)
+        buy_now = np.array([hma.can_buy(0) for hma in self.__hmas])
+        buy_prev = np.array([hma.can_buy(-1) for hma in self.__hmas])
+        sell_now = np.array([hma.can_sell(0) for hma in self.__hmas])
+        sell_prev = np.array([hma.can_sell(-1) for hma in self.__hmas])
+        step_whmas(
+            self.state,
+            running=self.__bars >= self.__minperiods - 1,
+            close=bar.close,
+            closing=closing_bars(bar.time, self.__interval),
+            buy1_now=buy_now[self.__h1],
+            buy1_prev=buy_prev[self.__h1],
+            sell2_now=sell_now[self.__h2],
+            sell_prev_by_active=np.stack(
+                [
+                    np.zeros(len(self.whma_params), dtype=bool),
+                    sell_prev[self.__h1],
+                    sell_prev[self.__h2],
+                    sell_prev[self.__h3],
+                ]
+            ),
+            stopprofit=self.stopprofit,
+        )
+        self.__bars += 1
+        return self.state.opentrades
+
+
+class StreamingSelector:
+    """WHMASelector for bars that arrive one at a time.
+
+    The batch selector picks the WHMA of a period by looking at that period's
+    own bars, which a live feed does not have yet. Here whma_sequence is
+    followed while it lasts, and after that each period runs the WHMA that
+    would have scored best over the period that just ended.
+    """
+
+    def __init__(
+        self, n_whmas: int, *, period: int, whma_sequence: Sequence[int] = ()
+    ) -> None:
+        self.period = period
+        self.whma_sequence = list(whma_sequence)
+        self.selected: list[int] = []
+        self.__targets = [Ring(period) for _ in range(n_whmas)]
+        self.__prices = Ring(period)
+        self.__bars = 0
+        self.gross_profit, self.opentrades, self.opentrade_price = 0, 0, 0
+        self.position_value = 0
+        # state at the start of the current period, for scoring it at its end
+        self.__period_start = (0, 0, 0)
+
+    def update(self, time, price: float, opentrades: np.ndarray) -> Decision:
+        if self.__bars % self.period == 0:
+            self.selected.append(self.__next_whma())
+            self.__period_start = (
+                self.gross_profit,
+                self.opentrades,
+                self.opentrade_price,
+            )
+        for ring, target in zip(self.__targets, opentrades):
+            ring.push(target)
+        self.__prices.push(price)
+        self.__bars += 1
+
+        active_whma_index = self.selected[-1]
+        result = compute_bar(
+            price=price,
+            target_opentrades=float(opentrades[active_whma_index]),
+            active_whma_index=active_whma_index,
+            gross_profit=self.gross_profit,
+            opentrades=self.opentrades,
+            opentrade_price=self.opentrade_price,
+        )
+        self.gross_profit = result.gross_profit
+        self.opentrades = result.opentrades
+        self.opentrade_price = result.opentrade_price
+        self.position_value = result.position_value
+        return Decision(
+            time=time,
+            price=price,
+            active_whma_index=active_whma_index,
+            buy_price=result.buy_price,
+            sell_price=result.sell_price,
+            opentrades=result.opentrades,
+            gross_profit=result.gross_profit,
+            position_value=result.position_value,
+        )
+
+    def __next_whma(self) -> int:
+        if len(self.selected) < len(self.whma_sequence):
+            return self.whma_sequence[len(self.selected)]
+        if not self.selected:
+            return 0
+        gross_profit, opentrades, opentrade_price = self.__period_start
+        scores = score_candidates(
+            np.array([ring.window() for ring in self.__targets]),
+            np.array(self.__prices.window()),
+            gross_profit=gross_profit,
+            opentrades=opentrades,
+            opentrade_price=opentrade_price,
+        )
+        return int(np.argmax(scores))
+
+    def score(self) -> float:
+        return self.position_value + self.gross_profit
+
+
+def run_stream(
+    bars: Iterable[Bar],
+    *,
+    whma_params: Sequence[tuple[int, int]],
+    period: int,
+    whma_sequence: Sequence[int] = (),
+) -> Iterator[Decision]:
+    """Yields the selector's decision as soon as each bar arrives."""
+    bank = StreamingWHMABank(whma_params)
+    selector = StreamingSelector(
+        len(bank.whma_params), period=period, whma_sequence=whma_sequence
+    )
+    for bar in bars:
+        opentrades = bank.update(bar)
+        price = (bar.open + bar.high + bar.low + bar.close) / 4
+        yield selector.update(bar.time, price, opentrades)
+
+
+def replay_bank(
+    opentrades: np.ndarray,
+    ohlc4: np.ndarray,
+    *,
+    period: int,
+    whma_sequence: Sequence[int] = (),
+) -> StreamingSelector:
+    """StreamingSelector run over a precomputed WHMABank's signal lines.
+
+    The same choices as run_stream() on the day's bars, without stepping the
+    Hull averages bar by bar. Returns the selector at the end of the day.
+    """
+    selector = StreamingSelector(
+        opentrades.shape[0], period=period, whma_sequence=whma_sequence
+    )
+    for bar_index, price in enumerate(ohlc4):
+        selector.update(None, float(price), opentrades[:, bar_index])
+    return selector
+
+
+async def run_stream_async(
+    queue: "asyncio.Queue[Optional[Bar]]",
+    *,
+    whma_params: Sequence[tuple[int, int]],
+    period: int,
+    whma_sequence: Sequence[int] = (),
+) -> AsyncIterator[Decision]:
+    """run_stream() fed from an asyncio queue, until a None is put on it."""
+    bank = StreamingWHMABank(whma_params)
+    selector = StreamingSelector(
+        len(bank.whma_params), period=period, whma_sequence=whma_sequence
+    )
+    while (bar := await queue.get()) is not None:
+        opentrades = bank.update(bar)
+        price = (bar.open + bar.high + bar.low + bar.close) / 4
+        yield selector.update(bar.time, price, opentrades)
+
+
+def replay_day(
+    filepath: str, *, warmup: int = WARMUP, timeframe: Optional[int] = None
+) -> Iterator[Bar]:
+    """The bars of a data/ file as a feed, led by the same padding as PandasData.
+
+    The first bar is repeated warmup times before the day starts so that the
+    Hull averages are warm by the first real bar.
+    """
+    df = load_day(filepath, timeframe)
+    interval = bar_interval(df)
+    first = df.iloc[0]
+    for i in range(warmup, 0, -1):
+        yield Bar(
+            time=(df.index[0] - i * interval).to_pydatetime(),
+            open=first.open,
+            high=first.high,
+            low=first.low,
+            close=first.close,
+        )
+    for time, row in zip(df.index, df.itertuples(index=False)):
+        yield Bar(
+            time=time.to_pydatetime(),
+            open=row.open,
+            high=row.high,
+            low=row.low,
+            close=row.close,
+        )
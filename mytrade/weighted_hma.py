@@ -2,36 +2,25 @@ from datetime import datetime
 import math
 from typing import Tuple
 import backtrader as bt
-from .big4 import big4
+from .data_cache import bar_interval, closing_bars
+from .indicator_registry import IndicatorRegistry
 
 
-class WeightedHMA(bt.Indicator):
+class HeadlessWeightedHMA(bt.Indicator):
+    """WeightedHMA without any of the plot-only lines.
+
+    Holds the trading logic and only the lines WHMASelector reads. Search runs
+    build this class so that nothing is allocated or painted for plotting.
+
+    Built with shared() from a strategy, its ohlc4 and Hull averages come from
+    an IndicatorRegistry as extra datas. Built on a single data, it makes its
+    own.
+    """
+
     _lines = lines = (
-        "hma1",
-        "hma2",
-        "hma3",
-        "active_hma1",
-        "active_hma2",
-        "active_hma3",
-        "w1",
-        "w2",
-        "w3",
-        "speed_hma1",
-        "accel_hma1",
-        "jerk_hma1",
-        "jounce_hma1",
-        "speed_hma2",
-        "accel_hma2",
-        "jerk_hma2",
-        "jounce_hma2",
-        "speed_hma3",
-        "accel_hma3",
-        "jerk_hma3",
-        "jounce_hma3",
         "buy",
         "sell",
         "gross_profit",
-        "ohlc4",
         "tick_profit",
         # "great_trend",
         # "great_trend_2",
@@ -42,80 +31,57 @@ class WeightedHMA(bt.Indicator):
         ("h2", 8),
         ("h3", 3),
         ("stopprofit", 0.05),
-        ("display_plots", "price"),
+        # the IndicatorRegistry of shared(), which also shares the Big4Memos
+        ("registry", None),
     )
-    _plotlines = plotlines = {
-        "great_trend": {"color": "purple"},
-        "active_hma1": {"color": "blue"},
-        "active_hma2": {"color": "orange"},
-        "active_hma3": {"color": "red"},
-        "ohlc4": {"color": "lightgray"},
-        "buy": {"marker": "^", "markersize": 8.0, "color": "lime", "fillstyle": "full"},
-        "sell": {"marker": "v", "markersize": 8.0, "color": "red", "fillstyle": "full"},
-        "tick_profit": {"_method": "bar"},
-    }
-    display_plots = {
-        "price": (
-            "active_hma1",
-            "active_hma2",
-            "active_hma3",
-            "ohlc4",
-            "buy",
-            "sell",
-            # "great_trend",
-            # "great_trend_2",
-        ),
-        "speed": (
-            "speed_hma1",
-            "accel_hma1",
-            "jerk_hma1",
-            "jounce_hma1",
-            "speed_hma2",
-            "accel_hma2",
-            "jerk_hma2",
-            "jounce_hma2",
-            "speed_hma3",
-            "accel_hma3",
-            "jerk_hma3",
-            "jounce_hma3",
-        ),
-        "profit": ("gross_profit", "tick_profit"),
-    }
+    plotinfo = {"plot": False}
+
+    @classmethod
+    def shared(cls, registry: IndicatorRegistry, data, **kwargs):
+        """Builds the WHMA on the ohlc4, Hull averages and big4 memos of registry."""
+        params = dict(cls.params._getitems(), **kwargs)
+        hmas = [registry.hma(data, params[h]) for h in ("h1", "h2", "h3")]
+        return cls(data, registry.ohlc4(data), *hmas, registry=registry, **kwargs)
 
     def __init__(self):
         super().__init__()
-        self.l.ohlc4 = (
-            self.data.open + self.data.high + self.data.low + self.data.close
-        ) / 4
-        self.l.hma1 = bt.ind.HullMovingAverage(self.ohlc4, period=self.p.h1)
-        self.l.hma2 = bt.ind.HullMovingAverage(self.ohlc4, period=self.p.h2)
-        self.l.hma3 = bt.ind.HullMovingAverage(self.ohlc4, period=self.p.h3)
+        if len(self.datas) == 1:
+            registry = IndicatorRegistry()
+            ohlc4 = registry.ohlc4(self.data)
+            hmas = [
+                registry.hma(self.data, h) for h in (self.p.h1, self.p.h2, self.p.h3)
+            ]
+        else:
+            registry = self.p.registry
+            ohlc4, *hmas = self.datas[1:5]
+        self.ohlc4 = ohlc4.lines[0]
+        self.hma1, self.hma2, self.hma3 = (x.lines[0] for x in hmas)
+        # the bar size of the PandasData feed, for when its last bar starts
+        self.__interval = bar_interval(self.data.p.dataname)
 
         # self.l.great_trend = bt.ind.ExponentialMovingAverage(self.ohlc4, period=20)
         # self.l.great_trend_2 = bt.ind.SMA(self.l.great_trend, period=20)
         # greater_trend = bt.ind.HullMovingAverage(self.ohlc4, period=80)
 
         self.opentrade_price = 0
+        # the role (1, 2 or 3) of the active Hull average, since shared ones
+        # are the same line whenever two roles have the same period
+        self.active_role = None
         self.active_hma = None
-        self.__paint_display_plots()
-
-    def __paint_display_plots(self):
-        for p in self._getlines():
-            getattr(self.plotlines, p)._plotskip = True
-        for p in self.display_plots[self.p.display_plots]:
-            getattr(self.plotlines, p)._plotskip = False
+        # derivatives of each Hull average are computed once for all WHMAs
+        self._big4 = {x: registry.big4(x) for x in (self.hma1, self.hma2, self.hma3)}
 
-    def __select_hma(self):
+    def __select_hma(self) -> int:
         profit = (
             self.data.close[0] - self.opentrade_price if self.opentrade_price else 0
         )
         profit_percent = profit / self.p.stopprofit
         if self.l.opentrades[0] == 0:
-            return self.hma1
-        elif profit_percent < 1 and self.active_hma is not self.hma3:
-            return self.hma2
+            return 1
+        elif profit_percent < 1 and self.active_role != 3:
+            return 2
         else:
-            return self.hma3
+            return 3
 
     def log(self):
         print(
@@ -123,12 +89,12 @@ class WeightedHMA(bt.Indicator):
         )
         # print(f"{self.l.gross_profit[0]=}")
 
-    def __can_buy(self, hma, ago) -> bool:
-        speed, accel, jerk, jounce = big4(hma, ago)
+    def _can_buy(self, hma, ago) -> bool:
+        speed, accel, jerk, jounce = self._big4[hma].big4(ago)
         return speed > 0 and accel > 0
 
-    def __can_sell(self, hma, ago) -> bool:
-        speed, accel, jerk, jounce = big4(hma, ago)
+    def _can_sell(self, hma, ago) -> bool:
+        speed, accel, jerk, jounce = self._big4[hma].big4(ago)
         return (
             speed < 0
             or (sum([speed, accel]) < 0)
@@ -136,6 +102,51 @@ class WeightedHMA(bt.Indicator):
             or (sum([speed, accel, jerk, jounce]) < 0)
         )
 
+    def compact(self):
+        """Keeps only a ring of recent bars in every line but opentrades.
+
+        WHMASelector reads opentrades by absolute bar index, while next() looks
+        no further back than [-1] in the others. Rings hold the WHMA's minperiod
+        bars, like backtrader's qbuffer(). Only for runonce with preloaded data,
+        which the owner must check, since the rings are moved by the home(),
+        buflen() and advance() overrides below.
+        """
+        for line in self.lines:
+            if line is not self.l.opentrades:
+                line.qbuffer()
+                line.minbuffer(2)
+        self.__compact = True
+
+    # A ring line moves by appending a bar, as in backtrader's next mode, also
+    # when runonce computes the WHMA by advancing over preallocated lines.
+    __compact = False
+
+    def home(self):
+        if not self.__compact:
+            return super().home()
+        for line in self.lines:
+            if line.mode == line.QBuffer:
+                line.reset()
+                # a ring only moves its index back when forced
+                line.set_idx(-1, force=True)
+            else:
+                line.home()
+
+    def buflen(self, line=0):
+        # runonce computes as many bars as the buffer of line 0 holds
+        if not self.__compact:
+            return self.lines.buflen(line)
+        return self.l.opentrades.buflen()
+
+    def advance(self, size=1):
+        if not self.__compact:
+            return super().advance(size)
+        for line in self.lines:
+            if line.mode == line.QBuffer:
+                line.forward(size=size)
+            else:
+                line.advance(size)
+
     def prenext(self):
         super().prenext()
         self.l.gross_profit[0] = 0
@@ -146,64 +157,30 @@ class WeightedHMA(bt.Indicator):
         self.l.opentrades[0] = self.l.opentrades[-1]
         self.tick_profit[0] = 0
 
-    def __paint_active_hma(self, active_hma):
-        if active_hma is self.hma1:
-            self.active_hma1[0] = self.hma1[0]
-            # paint over hma1 if hma2 is holding back the next buy
-            if self.__can_buy(self.hma1, -1) and self.__can_sell(self.hma2, 0):
-                self.active_hma2[-1] = self.hma2[-1]
-                self.active_hma2[0] = self.hma2[0]
-        elif active_hma is self.hma2:
-            self.active_hma2[0] = self.hma2[0]
-            if self.__can_sell(self.hma2, -1) and self.__can_buy(self.hma1, 0):
-                self.active_hma1[-1] = self.hma1[-1]
-                self.active_hma1[0] = self.hma1[0]
-        elif active_hma is self.hma3:
-            self.active_hma3[0] = self.hma3[0]
-            if self.__can_sell(self.hma3, -1) and self.__can_buy(self.hma1, 0):
-                self.active_hma1[-1] = self.hma1[-1]
-                self.active_hma1[0] = self.hma1[0]
-
-    def __paint_speed(self, active_hma):
-        (
-            self.speed_hma1[0],
-            self.accel_hma1[0],
-            self.jerk_hma1[0],
-            self.jounce_hma1[0],
-        ) = big4(self.hma1, 0)
-        (
-            self.speed_hma2[0],
-            self.accel_hma2[0],
-            self.jerk_hma2[0],
-            self.jounce_hma2[0],
-        ) = big4(self.hma2, 0)
-        (
-            self.speed_hma3[0],
-            self.accel_hma3[0],
-            self.jerk_hma3[0],
-            self.jounce_hma3[0],
-        ) = big4(self.hma3, 0)
+    def _paint(self, active_role: int):
+        """Paints the plot-only lines, which a headless run does not have."""
+        pass
 
     def next(self):
         self.__before_next()
-        self.active_hma = self.__select_hma()
-        self.__paint_active_hma(self.active_hma)
-        self.__paint_speed(self.active_hma)
+        self.active_role = self.__select_hma()
+        self.active_hma = (self.hma1, self.hma2, self.hma3)[self.active_role - 1]
+        self._paint(self.active_role)
 
         time: datetime = self.data.datetime.datetime()
 
-        if time.hour >= 19 and time.minute >= 50:
+        if closing_bars(time, self.__interval):
             self.__sell(comment=f"market closed")
         elif (
             self.l.opentrades[0] == 0
-            and self.__can_buy(self.l.hma1, -1)
-            and not self.__can_sell(self.l.hma2, 0)
+            and self._can_buy(self.hma1, -1)
+            and not self._can_sell(self.hma2, 0)
         ):
             self.__buy()
         elif (
             self.l.opentrades[0] > 0
-            and self.__can_sell(self.active_hma, -1)
-            and not self.__can_buy(self.l.hma1, 0)
+            and self._can_sell(self.active_hma, -1)
+            and not self._can_buy(self.hma1, 0)
         ):
             self.__sell()
 
@@ -238,3 +215,116 @@ class WeightedHMA(bt.Indicator):
     # @property
     # def active_hma(self) -> bt.ind.HullMovingAverage:
     #     return self.__active_hma
+
+
+class WeightedHMA(HeadlessWeightedHMA):
+    lines = (
+        "active_hma1",
+        "active_hma2",
+        "active_hma3",
+        "w1",
+        "w2",
+        "w3",
+        "speed_hma1",
+        "accel_hma1",
+        "jerk_hma1",
+        "jounce_hma1",
+        "speed_hma2",
+        "accel_hma2",
+        "jerk_hma2",
+        "jounce_hma2",
+        "speed_hma3",
+        "accel_hma3",
+        "jerk_hma3",
+        "jounce_hma3",
+    )
+    _lines = HeadlessWeightedHMA._lines + lines
+    params = (("display_plots", "price"),)
+    plotinfo = {"plot": True}
+    _plotlines = plotlines = {
+        "great_trend": {"color": "purple"},
+        "active_hma1": {"color": "blue"},
+        "active_hma2": {"color": "orange"},
+        "active_hma3": {"color": "red"},
+        "buy": {"marker": "^", "markersize": 8.0, "color": "lime", "fillstyle": "full"},
+        "sell": {"marker": "v", "markersize": 8.0, "color": "red", "fillstyle": "full"},
+        "tick_profit": {"_method": "bar"},
+    }
+    display_plots = {
+        "price": (
+            "active_hma1",
+            "active_hma2",
+            "active_hma3",
+            "buy",
+            "sell",
+            # "great_trend",
+            # "great_trend_2",
+        ),
+        "speed": (
+            "speed_hma1",
+            "accel_hma1",
+            "jerk_hma1",
+            "jounce_hma1",
+            "speed_hma2",
+            "accel_hma2",
+            "jerk_hma2",
+            "jounce_hma2",
+            "speed_hma3",
+            "accel_hma3",
+            "jerk_hma3",
+            "jounce_hma3",
+        ),
+        "profit": ("gross_profit", "tick_profit"),
+    }
+
+    def __init__(self):
+        super().__init__()
+        self.__paint_display_plots()
+
+    def __paint_display_plots(self):
+        for p in self._getlines():
+            getattr(self.plotlines, p)._plotskip = True
+        for p in self.display_plots[self.p.display_plots]:
+            getattr(self.plotlines, p)._plotskip = False
+
+    def _paint(self, active_role: int):
+        self.__paint_active_hma(active_role)
+        self.__paint_speed()
+
+    def __paint_active_hma(self, active_role: int):
+        if active_role == 1:
+            self.active_hma1[0] = self.hma1[0]
+            # paint over hma1 if hma2 is holding back the next buy
+            if self._can_buy(self.hma1, -1) and self._can_sell(self.hma2, 0):
+                self.active_hma2[-1] = self.hma2[-1]
+                self.active_hma2[0] = self.hma2[0]
+        elif active_role == 2:
+            self.active_hma2[0] = self.hma2[0]
+            if self._can_sell(self.hma2, -1) and self._can_buy(self.hma1, 0):
+                self.active_hma1[-1] = self.hma1[-1]
+                self.active_hma1[0] = self.hma1[0]
+        elif active_role == 3:
+            self.active_hma3[0] = self.hma3[0]
+            if self._can_sell(self.hma3, -1) and self._can_buy(self.hma1, 0):
+                self.active_hma1[-1] = self.hma1[-1]
+                self.active_hma1[0] = self.hma1[0]
+
+    def __paint_speed(self):
+        (
+            self.speed_hma1[0],
+            self.accel_hma1[0],
+            self.jerk_hma1[0],
+            self.jounce_hma1[0],
+        ) = self._big4[self.hma1].big4(0)
+        (
+            self.speed_hma2[0],
+            self.accel_hma2[0],
+            self.jerk_hma2[0],
+            self.jounce_hma2[0],
+        ) = self._big4[self.hma2].big4(0)
+        (
+            self.speed_hma3[0],
+            self.accel_hma3[0],
+            self.jerk_hma3[0],
+            self.jounce_hma3[0],
+        ) = self._big4[self.hma3].big4(0)
@@ -0,0 +1,397 @@
+from dataclasses import dataclass
+import math
+import operator
+from typing import Iterable, Sequence, Tuple
+import numpy as np
+import pandas as pd
+from .data_cache import bar_interval, closing_bars
+
+
+POS_SIZE = 300
+BIG4_SCALE = 100
+
+
+@dataclass(frozen=True, kw_only=True, slots=True)
+class WHMABank:
+    """Signal lines of a whole WeightedHMA grid.
+
+    Every 2-D array has shape (len(whma_params), n_bars) and row i matches the
+    backtrader WeightedHMA built with whma_params[i].
+    """
+
+    whma_params: list[tuple[int, int]]
+    ohlc4: np.ndarray
+    close: np.ndarray
+    hma1: np.ndarray
+    hma2: np.ndarray
+    hma3: np.ndarray
+    active_hma: np.ndarray
+    opentrades: np.ndarray
+    buy: np.ndarray
+    sell: np.ndarray
+    gross_profit: np.ndarray
+    tick_profit: np.ndarray
+
+    def __len__(self) -> int:
+        return self.ohlc4.shape[0]
+
+    def index_of(self, whma_params: tuple) -> int:
+        return self.whma_params.index(tuple(whma_params))
+
+
+def ohlc4(df: pd.DataFrame) -> np.ndarray:
+    return (
+        df["open"].to_numpy(dtype=float)
+        + df["high"].to_numpy(dtype=float)
+        + df["low"].to_numpy(dtype=float)
+        + df["close"].to_numpy(dtype=float)
+    ) / 4
+
+
+def weighted_moving_average(src: np.ndarray, period: int) -> np.ndarray:
+    # backtrader sums with math.fsum, which numpy cannot reproduce bit for
+    # bit. The windows are still built in numpy and only the exact sum runs
+    # per row.
+    coef = 2.0 / (period * (period + 1.0))
+    weights = np.arange(1, period + 1, dtype=float)
+    out = np.full(src.shape[0], math.nan)
+    valid = np.flatnonzero(~np.isnan(src))
+    start = valid[0] if len(valid) else len(src)
+    if len(src) - start < period:
+        return out
+    windows = np.lib.stride_tricks.sliding_window_view(src[start:], period)
+    sums = np.fromiter(map(math.fsum, windows * weights), float, len(windows))
+    out[start + period - 1 :] = coef * sums
+    return out
+
+
+def hull_moving_average(src: np.ndarray, period: int) -> np.ndarray:
+    wma = weighted_moving_average(src, period)
+    wma2 = 2.0 * weighted_moving_average(src, period // 2)
+    return weighted_moving_average(wma2 - wma, int(pow(period, 0.5)))
+
+
+def weighted_moving_averages(src: np.ndarray, period: int) -> np.ndarray:
+    """weighted_moving_average() along the last axis of every row of src.
+
+    Instead of math.fsum per window, the weighted bars are summed in
+    np.longdouble, where a few dozen prices of similar size add up exactly,
+    so the rounded sums match fsum's. On platforms whose long double is a
+    plain double, such as MSVC builds and macOS on arm64, they can differ in
+    the last bits. Leading nan bars carry
+    into every window they are part of, which leaves the same bars nan.
+    """
+    coef = 2.0 / (period * (period + 1.0))
+    n_windows = src.shape[-1] - period + 1
+    out = np.full(src.shape, math.nan)
+    if n_windows < 1:
+        return out
+    sums = np.zeros((*src.shape[:-1], n_windows), dtype=np.longdouble)
+    for k in range(period):
+        sums += src[..., k : k + n_windows] * float(k + 1)
+    out[..., period - 1 :] = coef * sums.astype(float)
+    return out
+
+
+def hull_moving_averages(src: np.ndarray, period: int) -> np.ndarray:
+    wma = weighted_moving_averages(src, period)
+    wma2 = 2.0 * weighted_moving_averages(src, period // 2)
+    return weighted_moving_averages(wma2 - wma, int(pow(period, 0.5)))
+
+
+def hma_minperiod(period: int) -> int:
+    return period + int(pow(period, 0.5)) - 1
+
+
+def big4_at(line: np.ndarray, index: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """Vectorized mytrade.big4.big4 evaluated at absolute bar indexes.
+
+    Mirrors line.get(ago, 2) on a fully preloaded buffer, including the
+    python slicing that wraps negative indexes around to the end of the day.
+    The bars are the last axis of line, so it can hold many lines at once.
+    """
+    n = line.shape[-1]
+    diff = np.empty(line.shape)
+    diff[..., 0] = math.nan
+    diff[..., 1:] = line[..., 1:] - line[..., :-1]
+
+    def speed(i):
+        wrapped = n + i
+        valid = (i >= 1) | ((i <= -2) & (wrapped >= 1))
+        j = np.where(i >= 1, i, wrapped)
+        return np.where(valid, diff[..., np.clip(j, 0, n - 1)], math.nan)
+
+    def accel(i):
+        return (speed(i) - speed(i - 2)) / 2
+
+    def jerk(i):
+        return (accel(i) - accel(i - 4)) / 4
+
+    def jounce(i):
+        return (jerk(i) - jerk(i - 8)) / 8
+
+    return (
+        BIG4_SCALE * speed(index),
+        BIG4_SCALE * accel(index),
+        BIG4_SCALE * jerk(index),
+        BIG4_SCALE * jounce(index),
+    )
+
+
+def can_buy_at(line: np.ndarray, ago: int) -> np.ndarray:
+    index = np.arange(line.shape[-1]) + ago
+    speed, accel, jerk, jounce = big4_at(line, index)
+    return (speed > 0) & (accel > 0)
+
+
+def can_sell_at(line: np.ndarray, ago: int) -> np.ndarray:
+    index = np.arange(line.shape[-1]) + ago
+    speed, accel, jerk, jounce = big4_at(line, index)
+    return (
+        (speed < 0)
+        | (speed + accel < 0)
+        | (speed + accel + jerk < 0)
+        | (speed + accel + jerk + jounce < 0)
+    )
+
+
+@dataclass(kw_only=True, slots=True)
+class WHMAState:
+    """Trade state of every WeightedHMA of a grid between two bars."""
+
+    opentrades: np.ndarray
+    opentrade_price: np.ndarray
+    gross_profit: np.ndarray
+    active_hma: np.ndarray
+
+    @classmethod
+    def zeros(cls, shape: int | tuple[int, ...]) -> "WHMAState":
+        return cls(
+            opentrades=np.zeros(shape),
+            opentrade_price=np.zeros(shape),
+            gross_profit=np.zeros(shape),
+            active_hma=np.zeros(shape, dtype=np.int8),
+        )
+
+
+@dataclass(frozen=True, kw_only=True, slots=True)
+class WHMAStep:
+    """What every WeightedHMA of a grid did on one bar."""
+
+    running: np.ndarray
+    buying: np.ndarray
+    selling: np.ndarray
+    tick_profit: np.ndarray
+    active_hma: np.ndarray
+
+
+def step_whmas(
+    state: WHMAState,
+    *,
+    running: np.ndarray,
+    close: float | np.ndarray,
+    closing: bool,
+    buy1_now: np.ndarray,
+    buy1_prev: np.ndarray,
+    sell2_now: np.ndarray,
+    sell_prev_by_active: np.ndarray,
+    stopprofit: float,
+) -> WHMAStep:
+    """WeightedHMA.next() of a whole grid for one bar, updating state.
+
+    The signal arguments hold one entry per WeightedHMA, in the shape of the
+    state, and close broadcasts against it. sell_prev_by_active is
+    can_sell(active_hma, -1) indexed by the active hma number 1, 2 or 3, with
+    row 0 unused.
+    """
+    o_price = state.opentrade_price
+    profit = np.where(o_price != 0, close - o_price, 0)
+    active = np.where(
+        state.opentrades == 0,
+        1,
+        np.where((profit / stopprofit < 1) & (state.active_hma != 3), 2, 3),
+    ).astype(np.int8)
+    if closing:
+        selling = state.opentrades > 0
+        buying = np.zeros(state.opentrades.shape, dtype=bool)
+    else:
+        buying = (state.opentrades == 0) & buy1_prev & ~sell2_now
+        selling = (
+            (state.opentrades > 0)
+            & np.take_along_axis(sell_prev_by_active, active[None], axis=0)[0]
+            & ~buy1_now
+        )
+    buying &= running
+    selling &= running
+
+    tick = np.where(selling, (close - o_price) * POS_SIZE, 0)
+    state.gross_profit = np.where(
+        selling, state.gross_profit + tick, state.gross_profit
+    )
+    state.opentrades = np.where(
+        buying, POS_SIZE, np.where(selling, 0, state.opentrades)
+    )
+    state.opentrade_price = np.where(buying, close, np.where(selling, 0, o_price))
+    state.active_hma = np.where(running, active, state.active_hma)
+    return WHMAStep(
+        running=running,
+        buying=buying,
+        selling=selling,
+        tick_profit=tick,
+        active_hma=active,
+    )
+
+
+def whma_minperiods(whma_params: Sequence[tuple[int, int]], h3: int) -> np.ndarray:
+    """Bars each WeightedHMA needs before it starts calling next()."""
+    return np.array(
+        [max(hma_minperiod(h) for h in (h1, h2, h3)) for h1, h2 in whma_params]
+    )
+
+
+def compute_whma_bank(
+    df: pd.DataFrame,
+    whma_params: Iterable[tuple[int, int]],
+    *,
+    h3: int = 3,
+    stopprofit: float = 0.05,
+) -> WHMABank:
+    """Computes every WeightedHMA of the grid in one batched pass.
+
+    df is the frame returned by mytrade.pandadata.PandasData. The per-bar
+    decisions are evaluated for all (h1, h2) pairs at once, and each distinct
+    Hull average is computed only once.
+    """
+    whma_params = [tuple(x) for x in whma_params]
+    n_whmas, n_bars = len(whma_params), df.shape[0]
+    price = ohlc4(df)
+    close = df["close"].to_numpy(dtype=float)
+    closing = closing_bars(df.index, bar_interval(df))
+
+    periods = sorted({h for params in whma_params for h in params} | {h3})
+    hmas = {h: hull_moving_average(price, h) for h in periods}
+    buy_now = {h: can_buy_at(hmas[h], 0) for h in periods}
+    buy_prev = {h: can_buy_at(hmas[h], -1) for h in periods}
+    sell_now = {h: can_sell_at(hmas[h], 0) for h in periods}
+    sell_prev = {h: can_sell_at(hmas[h], -1) for h in periods}
+
+    def stack(lines: dict, key) -> np.ndarray:
+        return np.stack([lines[key(params)] for params in whma_params])
+
+    hma1 = stack(hmas, operator.itemgetter(0))
+    hma2 = stack(hmas, operator.itemgetter(1))
+    hma3 = np.broadcast_to(hmas[h3], (n_whmas, n_bars)).copy()
+    buy1_now = stack(buy_now, operator.itemgetter(0))
+    buy1_prev = stack(buy_prev, operator.itemgetter(0))
+    sell2_now = stack(sell_now, operator.itemgetter(1))
+    sell_prev_by_active = np.stack(
+        [
+            np.zeros((n_whmas, n_bars), dtype=bool),
+            stack(sell_prev, operator.itemgetter(0)),
+            stack(sell_prev, operator.itemgetter(1)),
+            np.broadcast_to(sell_prev[h3], (n_whmas, n_bars)),
+        ]
+    )
+
+    opentrades = np.zeros((n_whmas, n_bars))
+    gross_profit = np.zeros((n_whmas, n_bars))
+    tick_profit = np.full((n_whmas, n_bars), math.nan)
+    buy = np.full((n_whmas, n_bars), math.nan)
+    sell = np.full((n_whmas, n_bars), math.nan)
+    active_hma = np.zeros((n_whmas, n_bars), dtype=np.int8)
+
+    # Each WeightedHMA only starts calling next() once its slowest Hull
+    # average is valid. Before that prenext() leaves the trade state at 0.
+    minperiods = whma_minperiods(whma_params, h3)
+    state = WHMAState.zeros(n_whmas)
+    for t in range(n_bars):
+        step = step_whmas(
+            state,
+            running=t >= minperiods - 1,
+            close=close[t],
+            closing=closing[t],
+            buy1_now=buy1_now[:, t],
+            buy1_prev=buy1_prev[:, t],
+            sell2_now=sell2_now[:, t],
+            sell_prev_by_active=sell_prev_by_active[:, :, t],
+            stopprofit=stopprofit,
+        )
+        opentrades[:, t] = state.opentrades
+        gross_profit[:, t] = state.gross_profit
+        tick_profit[:, t] = np.where(step.running, step.tick_profit, math.nan)
+        buy[:, t] = np.where(step.buying, close[t], math.nan)
+        sell[:, t] = np.where(step.selling, close[t], math.nan)
+        active_hma[:, t] = np.where(step.running, step.active_hma, 0)
+
+    return WHMABank(
+        whma_params=whma_params,
+        ohlc4=price,
+        close=close,
+        hma1=hma1,
+        hma2=hma2,
+        hma3=hma3,
+        active_hma=active_hma,
+        opentrades=opentrades,
+        buy=buy,
+        sell=sell,
+        gross_profit=gross_profit,
+        tick_profit=tick_profit,
+    )
+
+
+def compute_whma_opentrades(
+    price: np.ndarray,
+    close: np.ndarray,
+    closing: np.ndarray,
+    whma_params: Iterable[tuple[int, int]],
+    *,
+    h3: int = 3,
+    stopprofit: float = 0.05,
+) -> np.ndarray:
+    """opentrades of a WeightedHMA grid over many days of bars at once.
+
+    price and close hold the ohlc4 and close of one day per row, and closing
+    flags the bars of the closing minutes, which every row shares. Returns an
+    array of shape (n_rows, len(whma_params), n_bars) whose row s is
+    compute_whma_bank().opentrades of row s, except that the Hull averages
+    are summed like weighted_moving_averages().
+    """
+    whma_params = [tuple(x) for x in whma_params]
+    n_rows, n_bars = price.shape
+    shape = (n_rows, len(whma_params))
+    periods = sorted({h for params in whma_params for h in params} | {h3})
+    h1_index = np.array([periods.index(h1) for h1, _ in whma_params])
+    h2_index = np.array([periods.index(h2) for _, h2 in whma_params])
+    h3_index = periods.index(h3)
+
+    # signals of every distinct Hull average, shape (n_rows, periods, n_bars)
+    hmas = [hull_moving_averages(price, h) for h in periods]
+    buy_now = np.stack([can_buy_at(x, 0) for x in hmas], axis=1)
+    buy_prev = np.stack([can_buy_at(x, -1) for x in hmas], axis=1)
+    sell_now = np.stack([can_sell_at(x, 0) for x in hmas], axis=1)
+    sell_prev = np.stack([can_sell_at(x, -1) for x in hmas], axis=1)
+
+    opentrades = np.zeros((*shape, n_bars))
+    minperiods = whma_minperiods(whma_params, h3)
+    state = WHMAState.zeros(shape)
+    for t in range(n_bars):
+        step_whmas(
+            state,
+            running=t >= minperiods - 1,
+            close=close[:, t, None],
+            closing=closing[t],
+            buy1_now=buy_now[:, h1_index, t],
+            buy1_prev=buy_prev[:, h1_index, t],
+            sell2_now=sell_now[:, h2_index, t],
+            sell_prev_by_active=np.stack(
+                [
+                    np.zeros(shape, dtype=bool),
+                    sell_prev[:, h1_index, t],
+                    sell_prev[:, h2_index, t],
+                    np.broadcast_to(sell_prev[:, h3_index, t, None], shape),
+                ]
+            ),
+            stopprofit=stopprofit,
+        )
+        opentrades[:, :, t] = state.opentrades
+    return opentrades
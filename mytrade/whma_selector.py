@@ -1,11 +1,14 @@
+from array import array
 from collections import namedtuple
 from dataclasses import dataclass
 import math
 import random
 from re import L
-from typing import Iterator, NamedTuple, Tuple
+from typing import Iterator, NamedTuple, Optional, Sequence, Tuple
 import backtrader as bt
+import numpy as np
 from .big4 import big4
+from .indicator_registry import Ohlc4
 from .weighted_hma import WeightedHMA
 
 
@@ -34,52 +37,296 @@ class _ComputeBarResult:
     sell_price: float
 
 
-class WHMASelector(bt.ind.Indicator):
+@dataclass(frozen=True, kw_only=True, slots=True)
+class SelectorSnapshot:
+    """Selector state carried over at the end of the periods in path.
+
+    A run given a snapshot skips the periods of its prefix and resumes from
+    this state instead of replaying the day from bar 0. That only spares the
+    selector's own work: a backtrader run still computes every WeightedHMA
+    over the whole day, and only replay_path() on precomputed signal lines
+    costs no more than the remaining periods.
+    """
+
+    period: int
+    path: tuple[int, ...]
+    gross_profit: float
+    opentrades: int
+    opentrade_price: float
+    position_value: float
+
+    def score(self) -> float:
+        return self.position_value + self.gross_profit
+
+
+def compute_bar(
+    *,
+    price: float,
+    target_opentrades: int,
+    active_whma_index: int,
+    gross_profit: float,
+    opentrades: int,
+    opentrade_price: float,
+) -> _ComputeBarResult:
+    """Steps the selector state by one bar following the active WHMA."""
+    buy_price, sell_price = math.nan, math.nan
+    bar_profit = 0
+    if active_whma_index == -1:
+        if opentrades > 0:
+            bar_profit, opentrades, sell_price = _compute_sell(
+                price, opentrades, opentrade_price
+            )
+    elif target_opentrades > opentrades and opentrades == 0:
+        opentrades, opentrade_price, buy_price = _compute_buy(price, target_opentrades)
+    elif target_opentrades < opentrades and opentrades > 0:
+        bar_profit, opentrades, sell_price = _compute_sell(
+            price, opentrades, opentrade_price
+        )
+
+    position_value = opentrades * (price - opentrade_price)
+    gross_profit += bar_profit
+    return _ComputeBarResult(
+        gross_profit=gross_profit,
+        opentrades=opentrades,
+        opentrade_price=opentrade_price,
+        position_value=position_value,
+        buy_price=buy_price,
+        sell_price=sell_price,
+    )
+
+
+def _compute_buy(price: float, target_opentrades: int) -> Tuple[int, float, float]:
+    opentrade_price = buy_price = price
+    opentrades = target_opentrades
+    return opentrades, opentrade_price, buy_price
+
+
+def _compute_sell(
+    price: float, opentrades: int, opentrade_price: float
+) -> Tuple[float, int, float]:
+    sell_price = price
+    profit = (sell_price - opentrade_price) * opentrades
+    opentrades = 0
+    return profit, opentrades, sell_price
+
+
+class SelectorState:
+    """Per-bar selector state of a whole day in preallocated typed arrays.
+
+    compute_period() steps it in place, so a run allocates these once instead
+    of a _ComputeBarResult per bar, and each period is copied into the
+    backtrader lines with one slice assignment per line.
+    """
+
+    __slots__ = (
+        "gross_profit",
+        "opentrades",
+        "opentrade_price",
+        "position_value",
+        "buy",
+        "sell",
+    )
+
+    def __init__(self, n_bars: int) -> None:
+        for name in self.__slots__:
+            setattr(self, name, array("d", bytes(8 * n_bars)))
+
+
+def compute_period(
+    state: SelectorState,
+    lo: int,
+    hi: int,
+    *,
+    prices: Sequence[float],
+    targets: Sequence[float],
+    active_whma_index: int,
+    gross_profit: float,
+    opentrades: int,
+    opentrade_price: float,
+) -> None:
+    """compute_bar over bars lo..hi-1, written into state[lo:hi] in place."""
+    s_gross_profit, s_opentrades = state.gross_profit, state.opentrades
+    s_opentrade_price, s_position_value = state.opentrade_price, state.position_value
+    s_buy, s_sell = state.buy, state.sell
+    nan = math.nan
+    for i in range(lo, hi):
+        price = prices[i]
+        target_opentrades = targets[i]
+        buy_price, sell_price = nan, nan
+        if active_whma_index == -1:
+            if opentrades > 0:
+                gross_profit += (price - opentrade_price) * opentrades
+                opentrades, sell_price = 0, price
+        elif target_opentrades > opentrades and opentrades == 0:
+            opentrades, opentrade_price, buy_price = target_opentrades, price, price
+        elif target_opentrades < opentrades and opentrades > 0:
+            gross_profit += (price - opentrade_price) * opentrades
+            opentrades, sell_price = 0, price
+        s_gross_profit[i] = gross_profit
+        s_opentrades[i] = opentrades
+        s_opentrade_price[i] = opentrade_price
+        s_position_value[i] = opentrades * (price - opentrade_price)
+        s_buy[i] = buy_price
+        s_sell[i] = sell_price
+
+
+def step_candidates(
+    targets: np.ndarray,
+    prices: np.ndarray,
+    *,
+    gross_profit,
+    opentrades,
+    opentrade_price,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """compute_bar over the bars of the last axis for many candidates at once.
+
+    targets[..., t] holds every candidate's target opentrades at bar t and
+    prices broadcasts against targets. The state arguments are scalars or
+    arrays in the shape of the candidates. Returns the candidates'
+    (gross_profit, opentrades, opentrade_price, position_value) after the
+    last bar.
+    """
+    shape = targets.shape[:-1]
+    n_gross_profit = np.array(np.broadcast_to(gross_profit, shape), dtype=float)
+    n_opentrades = np.array(np.broadcast_to(opentrades, shape), dtype=float)
+    n_opentrade_price = np.array(np.broadcast_to(opentrade_price, shape), dtype=float)
+    position_value = np.zeros(shape)
+    prices = np.broadcast_to(prices, targets.shape)
+    for t in range(targets.shape[-1]):
+        target, price = targets[..., t], prices[..., t]
+        buying = (target > n_opentrades) & (n_opentrades == 0)
+        selling = ~buying & (target < n_opentrades) & (n_opentrades > 0)
+        profit = (price - n_opentrade_price) * n_opentrades
+        n_gross_profit = np.where(selling, n_gross_profit + profit, n_gross_profit)
+        n_opentrades = np.where(buying, target, np.where(selling, 0, n_opentrades))
+        n_opentrade_price = np.where(buying, price, n_opentrade_price)
+        position_value = n_opentrades * (price - n_opentrade_price)
+    return n_gross_profit, n_opentrades, n_opentrade_price, position_value
+
+
+def score_candidates(
+    targets: np.ndarray,
+    prices: np.ndarray,
+    *,
+    gross_profit: float,
+    opentrades: int,
+    opentrade_price: float,
+) -> np.ndarray:
+    """compute_bar over one period for every candidate WHMA at once.
+
+    targets[i] holds the opentrades line of candidate i over the period's bars
+    and prices the ohlc4 of those bars. Returns each candidate's
+    gross_profit + position_value at the end of the period.
+    """
+    n_gross_profit, _, _, position_value = step_candidates(
+        targets,
+        prices,
+        gross_profit=gross_profit,
+        opentrades=opentrades,
+        opentrade_price=opentrade_price,
+    )
+    return n_gross_profit + position_value
+
+
+def replay_path(
+    opentrades: Sequence[Sequence[float]],
+    ohlc4: Sequence[float],
+    path: Sequence[int],
+    *,
+    period: int,
+    snapshot: Optional[SelectorSnapshot] = None,
+) -> SelectorSnapshot:
+    """Headless WHMASelector run over precomputed signal lines.
+
+    opentrades[i] is the opentrades line of whmas[i]. The result matches a
+    selector built with whma_sequence=path and partial_run=len(path). Given
+    the snapshot of a prefix of path, only the remaining periods are replayed.
+    """
+    n_bars = len(ohlc4)
+    if snapshot:
+        assert snapshot.period == period, "snapshot of another period"
+        assert tuple(path[: len(snapshot.path)]) == snapshot.path
+        selected = list(snapshot.path)
+        gross_profit = snapshot.gross_profit
+        n_opentrades = snapshot.opentrades
+        opentrade_price = snapshot.opentrade_price
+        position_value = snapshot.position_value
+    else:
+        selected = []
+        gross_profit, n_opentrades, opentrade_price = 0, 0, 0
+        position_value = 0
+    num_periods = min(len(path), math.ceil(n_bars / period))
+    for period_index in range(len(selected), num_periods):
+        active_whma_idx = int(path[period_index])
+        selected.append(active_whma_idx)
+        signal = opentrades[active_whma_idx]
+        start_bar_index = period_index * period
+        for bar_index in range(start_bar_index, min(n_bars, start_bar_index + period)):
+            match compute_bar(
+                price=float(ohlc4[bar_index]),
+                target_opentrades=float(signal[bar_index]),
+                active_whma_index=active_whma_idx,
+                gross_profit=gross_profit,
+                opentrades=n_opentrades,
+                opentrade_price=opentrade_price,
+            ):
+                case _ComputeBarResult(
+                    gross_profit=gross_profit,
+                    opentrades=n_opentrades,
+                    opentrade_price=opentrade_price,
+                    position_value=position_value,
+                ):
+                    pass
+                case x:
+                    raise Exception(f"No match {x}")
+    return SelectorSnapshot(
+        period=period,
+        path=tuple(selected),
+        gross_profit=gross_profit,
+        opentrades=n_opentrades,
+        opentrade_price=opentrade_price,
+        position_value=position_value,
+    )
+
+
+class HeadlessWHMASelector(bt.ind.Indicator):
+    """WHMASelector without any of the plot-only lines.
+
+    Keeps only what get_score(), export_snapshot() and the carried period state
+    need, for search runs that are never plotted.
+    """
+
     params = [
         ("period", 20),
-        ("display_plots", "price"),
         ("whmas", []),
         ("whma_sequence", default_whma_sequence()),
         ("greedy", True),
         ("partial_run", None),
+        ("snapshot", None),
     ]
     plotinfo = {"plot": False}
     _lines = lines = (
-        "ohlc4",
-        "active_whma_index",
-        "active_whma_price",
         "gross_profit",
         "position_value",
         "opentrades",
         "opentrade_price",
-        "buy",
-        "sell",
     )
-    _plotlines = plotlines = {
-        "ohlc4": {"color": "lightgray"},
-        "buy": {"marker": "^", "markersize": 8.0, "color": "lime", "fillstyle": "full"},
-        "sell": {"marker": "v", "markersize": 8.0, "color": "red", "fillstyle": "full"},
-    }
-    display_plots = {
-        "price": ("ohlc4", "active_whma_price", "buy", "sell"),
-        "sequence": ("active_whma_index",),
-        "profit": ("gross_profit",),
-        "value": ("position_value",),
-    }
 
     def __init__(self) -> None:
         super().__init__()
-        self.l.ohlc4 = (
-            self.data.open + self.data.high + self.data.low + self.data.close
-        ) / 4
-        self.__set_display_plots()
+        # a strategy passes the ohlc4 of its IndicatorRegistry as data1
+        ohlc4 = self.data1 if len(self.datas) > 1 else Ohlc4(self.data)
+        self._prices = ohlc4.lines[0]
         self.p.whma_sequence = list(self.p.whma_sequence)
-
-    def __set_display_plots(self):
-        for p in self._getlines():
-            getattr(self.plotlines, p)._plotskip = True
-        for p in self.display_plots[self.p.display_plots]:
-            getattr(self.plotlines, p)._plotskip = False
+        self.__selected: list[int] = []
+        self.__state: Optional[SelectorState] = None
+        if snapshot := self.p.snapshot:
+            assert snapshot.period == self.p.period, "snapshot of another period"
+            assert (
+                self.p.greedy
+                or tuple(self.p.whma_sequence[: len(snapshot.path)]) == snapshot.path
+            ), "whma_sequence does not extend the snapshot path"
+            self.__selected = list(snapshot.path)
 
     def whmas_dict(self) -> dict[tuple, WeightedHMA]:
         return {x.get_params(): x for x in self.whmas_list()}
@@ -97,124 +344,64 @@ class WHMASelector(bt.ind.Indicator):
         self, end_bar_index: int, gross_profit, opentrades, opentrade_price
     ) -> int:
         if self.p.greedy:
-            max_score = -math.inf
-            max_index = -1
-            edges = list(enumerate(self.whmas_list()))
+            edges = list(range(len(self.whmas_list())))
             random.shuffle(edges)
-            for active_whma_idx, active_whma in edges:
-                n_gross_profit = gross_profit
-                n_opentrades = opentrades
-                n_opentrade_price = opentrade_price
-                n_position_value = None
-                for bar_index in self.__iter_period_bar_index():
-                    match self.__compute_bar(
-                        bar_index=bar_index,
-                        active_whma_index=active_whma_idx,
-                        active_whma=active_whma,
-                        gross_profit=n_gross_profit,
-                        opentrades=n_opentrades,
-                        opentrade_price=n_opentrade_price,
-                    ):
-                        case _ComputeBarResult(
-                            gross_profit=n_gross_profit,
-                            opentrades=n_opentrades,
-                            opentrade_price=n_opentrade_price,
-                            position_value=n_position_value,
-                        ):
-                            pass
-                        case x:
-                            raise Exception(f"No match {x}")
-                n_score = n_gross_profit + n_position_value
-                if n_score > max_score:
-                    max_score = n_score
-                    max_index = active_whma_idx
-            return max_index
+            bars = list(self.__iter_period_bar_index())
+            lo, hi = bars[0], bars[-1] + 1
+            scores = score_candidates(
+                np.array([x.l.opentrades.array[lo:hi] for x in self.whmas_list()]),
+                np.array(self._prices.array[lo:hi]),
+                gross_profit=gross_profit,
+                opentrades=opentrades,
+                opentrade_price=opentrade_price,
+            )[edges]
+            # the first candidate in shuffled order wins ties
+            if not (scores > -math.inf).any():
+                return -1
+            return edges[int(np.nanargmax(scores))]
         else:
             period_index = end_bar_index // self.p.period
             whma_idx = int(self.p.whma_sequence[period_index])
             return whma_idx
 
     def __period_end(self, end_bar_index: int):
-        if self.__start_bar_index == 0:
+        if self.__state is None:
+            self.__state = SelectorState(len(self.data.array))
+        state = self.__state
+        lo, hi = self.__start_bar_index, end_bar_index + 1
+        if lo == 0:
             gross_profit = 0
             opentrades = 0
             opentrade_price = 0
+        elif lo == self.__resume_bar_index():
+            gross_profit = self.p.snapshot.gross_profit
+            opentrades = self.p.snapshot.opentrades
+            opentrade_price = self.p.snapshot.opentrade_price
         else:
-            gross_profit = self.l.gross_profit.array[self.__start_bar_index - 1]
-            opentrades = self.l.opentrades.array[self.__start_bar_index - 1]
-            opentrade_price = self.l.opentrade_price.array[self.__start_bar_index - 1]
+            gross_profit = state.gross_profit[lo - 1]
+            opentrades = state.opentrades[lo - 1]
+            opentrade_price = state.opentrade_price[lo - 1]
         active_whma_idx = self.__select_active_whma(
             end_bar_index, gross_profit, opentrades, opentrade_price
         )
         active_whma = self.p.whmas[active_whma_idx]
-        for bar_index in self.__iter_period_bar_index():
-            match self.__compute_bar(
-                bar_index=bar_index,
-                active_whma_index=active_whma_idx,
-                active_whma=active_whma,
-                gross_profit=gross_profit,
-                opentrades=opentrades,
-                opentrade_price=opentrade_price,
-            ):
-                case _ComputeBarResult(
-                    gross_profit=gross_profit,
-                    opentrades=opentrades,
-                    opentrade_price=opentrade_price,
-                    position_value=position_value,
-                    buy_price=buy_price,
-                    sell_price=sell_price,
-                ):
-                    self.__paint_active_whma_price(bar_index, active_whma)
-                    self.__paint_gross_profit(bar_index, gross_profit)
-                    self.__paint_active_whma_index(bar_index, active_whma_idx)
-                    self.__paint_buy(bar_index, buy_price)
-                    self.__paint_sell(bar_index, sell_price)
-                    self.__paint_position_value(bar_index, position_value)
-                    self.__paint_opentrades(bar_index, opentrades)
-                    self.__paint_opentrade_price(bar_index, opentrade_price)
-                case x:
-                    raise Exception(f"No match {x}")
-
-        # print(self.l.gross_profit.array[end_bar_index], self.l.active_whma_index.array)
-
-    def __compute_bar(
-        self,
-        *,
-        bar_index: int,
-        active_whma_index: int,
-        active_whma: WeightedHMA,
-        gross_profit: float,
-        opentrades: int,
-        opentrade_price: float,
-    ) -> _ComputeBarResult:
-        price = self.l.ohlc4.array[bar_index]
-        target_opentrades = active_whma.l.opentrades.array[bar_index]
-        buy_price, sell_price = math.nan, math.nan
-        bar_profit = 0
-        if active_whma_index == -1:
-            if opentrades > 0:
-                bar_profit, opentrades, sell_price = self.__compute_sell(
-                    bar_index, opentrades, opentrade_price
-                )
-        elif target_opentrades > opentrades and opentrades == 0:
-            opentrades, opentrade_price, buy_price = self.__compute_buy(
-                bar_index, active_whma
-            )
-        elif target_opentrades < opentrades and opentrades > 0:
-            bar_profit, opentrades, sell_price = self.__compute_sell(
-                bar_index, opentrades, opentrade_price
-            )
-
-        position_value = opentrades * (price - opentrade_price)
-        gross_profit += bar_profit
-        return _ComputeBarResult(
+        self.__selected.append(active_whma_idx)
+        compute_period(
+            state,
+            lo,
+            hi,
+            prices=self._prices.array,
+            targets=active_whma.l.opentrades.array,
+            active_whma_index=active_whma_idx,
             gross_profit=gross_profit,
             opentrades=opentrades,
             opentrade_price=opentrade_price,
-            position_value=position_value,
-            buy_price=buy_price,
-            sell_price=sell_price,
         )
+        self.l.gross_profit.array[lo:hi] = state.gross_profit[lo:hi]
+        self.l.position_value.array[lo:hi] = state.position_value[lo:hi]
+        self.l.opentrades.array[lo:hi] = state.opentrades[lo:hi]
+        self.l.opentrade_price.array[lo:hi] = state.opentrade_price[lo:hi]
+        self._paint(lo, hi, active_whma, active_whma_idx, state)
 
     def __iter_period_bar_index(self) -> Iterator[int]:
         bar_index = self.__len__() - 1
@@ -224,16 +411,32 @@ class WHMASelector(bt.ind.Indicator):
         for i in range(min_index, max_index + 1):
             yield i
 
-    def __paint_gross_profit(self, bar_index: int, profit: int):
-        self.l.gross_profit.array[bar_index] = profit
+    def _paint(
+        self,
+        lo: int,
+        hi: int,
+        active_whma: WeightedHMA,
+        active_whma_idx: int,
+        state: SelectorState,
+    ):
+        """Paints bars lo..hi-1 of the plot-only lines, which a headless run
+        does not have."""
+        pass
 
     def __partial_run_stop(self):
         return self.p.partial_run and len(self) > self.p.period * self.p.partial_run
 
+    def __resume_bar_index(self) -> int:
+        if self.p.snapshot:
+            return len(self.p.snapshot.path) * self.p.period
+        return 0
+
     def next(self):
         if self.__partial_run_stop():
             return
         bar_index = self.__len__() - 1
+        if bar_index < self.__resume_bar_index():
+            return
         if bar_index % self.p.period == 0:
             self.__period_start(bar_index)
         if (
@@ -242,54 +445,85 @@ class WHMASelector(bt.ind.Indicator):
         ):
             self.__period_end(bar_index)
 
-    def __paint_active_whma_price(self, bar_index: int, active_whma: WeightedHMA):
-        self.l.active_whma_price.array[bar_index] = active_whma.active_hma.array[
-            bar_index
-        ]
-
-    def __paint_position_value(self, bar_index: int, value: float):
-        self.l.position_value.array[bar_index] = value
-
-    def __paint_buy(self, bar_index: int, buy_price: float):
-        self.l.buy.array[bar_index] = buy_price
-
-    def __paint_sell(self, bar_index: int, sell_price: float):
-        self.l.sell.array[bar_index] = sell_price
-
-    def __paint_opentrade_price(self, bar_index: int, opentrade_price: float):
-        self.l.opentrade_price.array[bar_index] = opentrade_price
-
-    def __paint_opentrades(self, bar_index: int, opentrades: int):
-        self.l.opentrades.array[bar_index] = opentrades
-
-    def __paint_active_whma_index(self, bar_index, active_whma_idx):
-        self.l.active_whma_index.array[bar_index] = active_whma_idx
-
-    def __compute_buy(self, bar_index: int, active_whma: WeightedHMA) -> Tuple[int]:
-        opentrade_price = buy_price = self.l.ohlc4.array[bar_index]
-        opentrades = active_whma.l.opentrades.array[bar_index]
-        return opentrades, opentrade_price, buy_price
-
-    def __compute_sell(
-        self, bar_index: int, opentrades: int, opentrade_price: float
-    ) -> Tuple[float, int, float]:
-        sell_price = self.l.ohlc4.array[bar_index]
-        profit = (sell_price - opentrade_price) * opentrades
-        opentrades = 0
-        return profit, opentrades, sell_price
-
-    def get_score(self) -> float:
+    def __score_bar_index(self) -> int:
         if self.p.partial_run:
-            bar_index = min(
+            return min(
                 self.l.position_value.lencount - 1,
                 self.p.partial_run * self.p.period - 1,
             )
-        else:
-            bar_index = -1
+        return -1
+
+    def get_score(self) -> float:
+        if self.p.snapshot and self.__selected == list(self.p.snapshot.path):
+            return self.p.snapshot.score()
+        bar_index = self.__score_bar_index()
         return (
             self.l.position_value.array[bar_index]
             + self.l.gross_profit.array[bar_index]
         )
 
+    def export_snapshot(self) -> SelectorSnapshot:
+        """Snapshot of the state get_score() reads, keyed by the run's path."""
+        if self.p.snapshot and self.__selected == list(self.p.snapshot.path):
+            return self.p.snapshot
+        bar_index = self.__score_bar_index()
+        return SelectorSnapshot(
+            period=self.p.period,
+            path=tuple(self.__selected),
+            gross_profit=self.l.gross_profit.array[bar_index],
+            opentrades=self.l.opentrades.array[bar_index],
+            opentrade_price=self.l.opentrade_price.array[bar_index],
+            position_value=self.l.position_value.array[bar_index],
+        )
+
+
+class WHMASelector(HeadlessWHMASelector):
+    params = [("display_plots", "price")]
+    lines = (
+        "ohlc4",
+        "active_whma_index",
+        "active_whma_price",
+        "buy",
+        "sell",
+    )
+    _lines = HeadlessWHMASelector._lines + lines
+    _plotlines = plotlines = {
+        "ohlc4": {"color": "lightgray"},
+        "buy": {"marker": "^", "markersize": 8.0, "color": "lime", "fillstyle": "full"},
+        "sell": {"marker": "v", "markersize": 8.0, "color": "red", "fillstyle": "full"},
+    }
+    display_plots = {
+        "price": ("ohlc4", "active_whma_price", "buy", "sell"),
+        "sequence": ("active_whma_index",),
+        "profit": ("gross_profit",),
+        "value": ("position_value",),
+    }
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.__set_display_plots()
+
+    def __set_display_plots(self):
+        for p in self._getlines():
+            getattr(self.plotlines, p)._plotskip = True
+        for p in self.display_plots[self.p.display_plots]:
+            getattr(self.plotlines, p)._plotskip = False
+
+    def _paint(
+        self,
+        lo: int,
+        hi: int,
+        active_whma: WeightedHMA,
+        active_whma_idx: int,
+        state: SelectorState,
+    ):
+        self.l.ohlc4.array[lo:hi] = self._prices.array[lo:hi]
+        self.l.active_whma_price.array[lo:hi] = active_whma.active_hma.array[lo:hi]
+        self.l.active_whma_index.array[lo:hi] = array("d", [active_whma_idx]) * (
+            hi - lo
+        )
+        self.l.buy.array[lo:hi] = state.buy[lo:hi]
+        self.l.sell.array[lo:hi] = state.sell[lo:hi]
+
     def _plotlabel(self) -> list[str]:
         return [self.p.period, list(self.l.active_whma_index)]
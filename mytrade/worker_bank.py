@@ -0,0 +1,50 @@
+from dataclasses import dataclass
+from typing import Optional, Tuple
+import numpy as np
+from . import profiling
+from .pandadata import PandasData
+from .whma_engine import compute_whma_bank
+from .whma_selector import SelectorSnapshot, replay_path
+
+
+@dataclass(frozen=True, kw_only=True, slots=True)
+class BankEvaluator:
+    """eval_profit of trade.search_day() that scores paths on a local WHMABank.
+
+    Only this small spec is pickled with each task. The worker process that
+    runs it loads the day and builds the bank on its first task, and every
+    later task of the same search only replays its path on that bank.
+    """
+
+    file: str
+    whma_params: Tuple[Tuple[int, int], ...]
+    period: int
+    timeframe: Optional[int] = None
+
+    def __call__(self, args) -> tuple[float, list[int], SelectorSnapshot]:
+        path, snapshot = args
+        opentrades, ohlc4 = load_bank(self)
+        with profiling.phase("replay_path"):
+            snapshot = replay_path(
+                opentrades, ohlc4, path, period=self.period, snapshot=snapshot
+            )
+        return snapshot.score(), path, snapshot
+
+
+# The bank of the search this process last worked on, whichever solver used it
+_banks: dict[BankEvaluator, Tuple[np.ndarray, np.ndarray]] = {}
+
+
+def load_bank(evaluator: BankEvaluator) -> Tuple[np.ndarray, np.ndarray]:
+    """(opentrades, ohlc4) of the evaluator's day, built once per process.
+
+    Also the bank of the dp and shared memory solvers, so that everything a
+    process does with one day shares a single build of its WHMA lines.
+    """
+    if evaluator not in _banks:
+        with profiling.phase("build bank"):
+            data, df = PandasData(evaluator.file, evaluator.timeframe)
+            bank = compute_whma_bank(df, evaluator.whma_params)
+        _banks.clear()
+        _banks[evaluator] = bank.opentrades, bank.ohlc4
+    return _banks[evaluator]
@@ -0,0 +1,105 @@
+#!python3
+import time
+import click
+import numpy as np
+import pandas as pd
+from mytrade.data_cache import bar_interval, closing_bars
+from mytrade.dp_solver import solve_whma_sequence
+from mytrade.pandadata import PandasData
+from mytrade.robustness import block_bootstrap, path_scores, policy_scores, price_noise
+from mytrade.streaming import replay_bank
+from mytrade.whma_engine import compute_whma_bank, compute_whma_opentrades
+from mytrade.whma_selector import replay_path
+from trade import PERIOD, WHMA_PARAMS
+
+
+@click.command()
+@click.option("--file", default="./data/2022-09-09.csv")
+@click.option(
+    "--path",
+    "path_text",
+    default=None,
+    help="WHMA index per period, space separated. Defaults to the dp solver's.",
+)
+@click.option(
+    "--policy",
+    type=click.Choice(["path", "causal"]),
+    default="path",
+    help="Score the path, or the streaming selector's choices.",
+)
+@click.option(
+    "--method", type=click.Choice(["bootstrap", "noise"]), default="bootstrap"
+)
+@click.option("--sims", "n_sims", default=2000, help="Simulated days.")
+@click.option("--block", default=10, help="Bars per bootstrap block.")
+@click.option("--noise", default=0.5, help="Noise std in close return stds.")
+@click.option("--period", default=PERIOD)
+@click.option("--timeframe", type=int, default=None, help="Bar size in minutes.")
+@click.option("--seed", default=0)
+@click.option("-o", "--output", default="./robustness_scores.csv")
+def main(
+    file,
+    path_text,
+    policy,
+    method,
+    n_sims,
+    block,
+    noise,
+    period,
+    timeframe,
+    seed,
+    output,
+):
+    started = time.time()
+    data, df = PandasData(file, timeframe)
+    bank = compute_whma_bank(df, WHMA_PARAMS)
+    if policy == "causal":
+        path = []
+        original = replay_bank(bank.opentrades, bank.ohlc4, period=period).score()
+    else:
+        if path_text is None:
+            _, path = solve_whma_sequence(bank.opentrades, bank.ohlc4, period=period)
+        else:
+            path = [int(x) for x in path_text.split()]
+        original = replay_path(bank.opentrades, bank.ohlc4, path, period=period).score()
+
+    rng = np.random.default_rng(seed)
+    if method == "bootstrap":
+        sims = block_bootstrap(df, n_sims, block=block, rng=rng)
+    else:
+        sims = price_noise(df, n_sims, scale=noise, rng=rng)
+    closing = closing_bars(df.index, bar_interval(df))
+
+    def batched_scores(price: np.ndarray, close: np.ndarray) -> np.ndarray:
+        opentrades = compute_whma_opentrades(price, close, closing, WHMA_PARAMS)
+        if policy == "causal":
+            return policy_scores(opentrades, price, period=period)
+        return path_scores(opentrades, price, path, period=period)
+
+    scores = batched_scores(sims.ohlc4, sims.close)
+    # The simulations run on the batched engine, which only matches the exact
+    # one where np.longdouble is wider than a double (not on MSVC builds or
+    # macOS on arm64).
+    [batched] = batched_scores(bank.ohlc4[None], bank.close[None])
+    if batched != original:
+        print(
+            f"warning: the batched engine scores the original bars {batched:.2f}, "
+            f"not {original:.2f}: rounding differences flip some of its signals"
+        )
+
+    pd.DataFrame({"score": scores}).to_csv(output, index_label="sim")
+    quantiles = np.percentile(scores, [5, 25, 50, 75, 95])
+    print(f"original {original:.2f} over {len(sims)} {method} days of {file}")
+    print(
+        f"mean {scores.mean():.2f} std {scores.std():.2f} "
+        f"losing {np.mean(scores < 0):.1%} below original {np.mean(scores < original):.1%}"
+    )
+    print(
+        "quantiles "
+        + " ".join(f"p{q} {x:.2f}" for q, x in zip((5, 25, 50, 75, 95), quantiles))
+    )
+    print(f"{time.time() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import math
+import backtrader as bt
+import numpy as np
+from mytrade.big4 import Big4Memo, big4
+from mytrade.pandadata import PandasData
+from trade import PERIOD, WHMA_PARAMS, run_once
+
+DAY = "./data/2022-09-09.csv"
+
+
+def test_history_memo_matches_big4_over_repeated_sweeps():
+    values = np.cumsum(np.random.default_rng(0).normal(size=60))
+    line = bt.LineBuffer()
+    for value in values:
+        line.forward()
+        line[0] = value
+    memo = Big4Memo(line, history=True)
+    # runonce moves every reader of a shared line over all of its bars in turn
+    for _ in range(2):
+        line.home()
+        for _ in values:
+            line.advance()
+            for ago in (0, -1):
+                expected = big4(line, ago)
+                got = memo.big4(ago)
+                assert all(
+                    a == b or (math.isnan(a) and math.isnan(b))
+                    for a, b in zip(got, expected)
+                )
+
+
+def test_whmas_share_the_memo_of_a_shared_hma():
+    data, df = PandasData(DAY)
+    cerebro, strat = run_once(
+        data,
+        name=DAY,
+        plot=False,
+        whma_sequence=[3, 7, 11] * 100,
+        partial_run=None,
+        period=PERIOD,
+        greedy=False,
+        whma_params=WHMA_PARAMS,
+        headless=True,
+    )
+    memos: dict[int, Big4Memo] = {}
+    for whma in strat.whmas:
+        for line, memo in whma._big4.items():
+            assert memos.setdefault(id(line), memo) is memo
+    assert len(memos) == len(strat.indicators) - 1
@@ -0,0 +1,75 @@
+import datetime
+import numpy as np
+import pandas as pd
+import pytest
+from mytrade.data_cache import closing_bars
+from mytrade.pandadata import PandasData
+from mytrade.streaming import StreamingWHMABank, replay_day
+from mytrade.whma_engine import compute_whma_bank
+from trade import PERIOD, WHMA_PARAMS, run_once
+
+DAY = "./data/2022-09-09.csv"
+
+
+def at(hour: int, minute: int) -> datetime.datetime:
+    return datetime.datetime(2022, 9, 9, hour, minute)
+
+
+@pytest.mark.parametrize(
+    "minutes, start, closing",
+    [
+        (3, at(19, 48), False),
+        (3, at(19, 51), True),
+        (3, at(19, 57), True),
+        (15, at(19, 30), False),
+        (15, at(19, 45), True),
+        (30, at(19, 0), False),
+        (30, at(19, 30), True),
+    ],
+)
+def test_closing_bars(minutes, start, closing):
+    assert closing_bars(start, pd.Timedelta(minutes=minutes)) is closing
+
+
+def test_closing_bars_of_index():
+    index = pd.DatetimeIndex([at(19, 0), at(19, 15), at(19, 30), at(19, 45)])
+    flags = closing_bars(index, pd.Timedelta(minutes=15))
+    assert flags.tolist() == [False, False, False, True]
+
+
+@pytest.mark.parametrize("timeframe", [15, 30])
+def test_bank_is_flat_after_the_last_bar(timeframe):
+    data, df = PandasData(DAY, timeframe)
+    bank = compute_whma_bank(df, WHMA_PARAMS)
+    assert not bank.opentrades[:, -1].any()
+    assert np.isfinite(bank.sell[:, -1]).any()
+
+
+def test_backtrader_whmas_are_flat_after_the_last_bar():
+    # a 30m day has fewer bars than the longest HMA needs for backtrader
+    data, df = PandasData(DAY, 15)
+    cerebro, strat = run_once(
+        data=data,
+        name=DAY,
+        plot=False,
+        whma_sequence=[],
+        partial_run=None,
+        period=PERIOD,
+        greedy=True,
+        whma_params=WHMA_PARAMS,
+        headless=True,
+    )
+    opentrades = np.array([whma.l.opentrades.array[-1] for whma in strat.whmas])
+    bank = compute_whma_bank(df, WHMA_PARAMS)
+    assert not opentrades.any()
+    assert np.array_equal(
+        [whma.l.opentrades.array for whma in strat.whmas], bank.opentrades
+    )
+
+
+@pytest.mark.parametrize("timeframe", [15, 30])
+def test_streaming_bank_is_flat_after_the_last_bar(timeframe):
+    bank = StreamingWHMABank(WHMA_PARAMS)
+    for bar in replay_day(DAY, timeframe=timeframe):
+        opentrades = bank.update(bar)
+    assert not opentrades.any()
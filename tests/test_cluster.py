@@ -0,0 +1,23 @@
+import threading
+from mytrade.cluster import Coordinator, _QueueManager, run_worker
+
+
+def start(target, *args) -> threading.Thread:
+    thread = threading.Thread(target=target, args=args, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_worker_skips_shards_of_abandoned_calls():
+    coordinator = Coordinator(authkey=b"test")
+    manager = _QueueManager(address=coordinator.address, authkey=b"test")
+    manager.connect()
+    # a shard still queued after its call gave up and unregistered its function
+    manager.tasks().put((-1, [(0, 1)]))
+    worker = start(run_worker, coordinator.address, b"test")
+    results = []
+    start(lambda: results.extend(coordinator.imap(abs, [-1, -2, -3]))).join(30)
+    assert sorted(results) == [1, 2, 3]
+    coordinator.stop(1)
+    worker.join(30)
+    assert not worker.is_alive()
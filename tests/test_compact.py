@@ -0,0 +1,45 @@
+import pytest
+from mytrade.pandadata import PandasData
+from trade import PERIOD, WHMA_PARAMS, build_cerebro, run_once
+
+DAY = "./data/2022-09-09.csv"
+SEQUENCE = [3, 7, 11] * 100
+
+
+def score(compact: bool) -> float:
+    data, df = PandasData(DAY)
+    cerebro, strat = run_once(
+        data,
+        name=DAY,
+        plot=False,
+        whma_sequence=SEQUENCE,
+        partial_run=None,
+        period=PERIOD,
+        greedy=False,
+        whma_params=WHMA_PARAMS,
+        headless=True,
+        compact=compact,
+    )
+    return strat.selector.get_score()
+
+
+def test_compact_run_scores_like_a_full_one():
+    assert score(compact=True) == score(compact=False)
+
+
+def test_compact_run_needs_runonce():
+    data, df = PandasData(DAY)
+    cerebro = build_cerebro(
+        data,
+        name=DAY,
+        whma_sequence=SEQUENCE,
+        period=PERIOD,
+        partial_run=None,
+        greedy=False,
+        whma_params=WHMA_PARAMS,
+        snapshot=None,
+        headless=True,
+        compact=True,
+    )
+    with pytest.raises(AssertionError, match="runonce"):
+        cerebro.run(runonce=False)
@@ -0,0 +1,22 @@
+import numpy as np
+from mytrade.data_cache import WARMUP, load_day
+from mytrade.pandadata import PandasData
+from mytrade.robustness import block_bootstrap
+from mytrade.streaming import replay_day
+
+DAY = "./data/2022-09-09.csv"
+
+
+def test_feeds_share_the_warmup_padding():
+    data, df = PandasData(DAY)
+    bars = list(replay_day(DAY))
+    assert len(df) == len(load_day(DAY)) + WARMUP == len(bars)
+    assert [bar.time for bar in bars] == list(df.index.to_pydatetime())
+    assert (df.iloc[:WARMUP] == df.iloc[WARMUP]).all(axis=None)
+
+
+def test_simulations_line_up_with_the_padded_day():
+    data, df = PandasData(DAY)
+    sims = block_bootstrap(df, 3, block=5, rng=np.random.default_rng(0))
+    assert sims.close.shape == (3, len(df))
+    assert (sims.close[:, : WARMUP + 1] == df["close"].iloc[0]).all()
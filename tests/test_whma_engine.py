@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+from mytrade.data_cache import bar_interval, closing_bars
+from mytrade.pandadata import PandasData
+from mytrade.whma_engine import compute_whma_bank, compute_whma_opentrades
+from trade import PERIOD, WHMA_PARAMS, run_once
+
+# summed in plain doubles, the Hull averages of 2022-08-30 and 2022-09-08
+# flip some signals
+DAYS = [
+    "./data/2022-05-02.csv",
+    "./data/2022-08-30.csv",
+    "./data/2022-09-08.csv",
+    "./data/2022-09-15.csv",
+]
+
+# the batched engine only sums as exactly as math.fsum in a wider long double
+wide_longdouble = pytest.mark.skipif(
+    np.finfo(np.longdouble).nmant <= np.finfo(float).nmant,
+    reason="np.longdouble is a plain double here",
+)
+
+
+@wide_longdouble
+@pytest.mark.parametrize("timeframe", [None, 15])
+@pytest.mark.parametrize("file", DAYS)
+def test_batched_engine_matches_the_bank(file, timeframe):
+    data, df = PandasData(file, timeframe)
+    bank = compute_whma_bank(df, WHMA_PARAMS)
+    closing = closing_bars(df.index, bar_interval(df))
+    [opentrades] = compute_whma_opentrades(
+        bank.ohlc4[None], bank.close[None], closing, WHMA_PARAMS
+    )
+    assert np.array_equal(opentrades, bank.opentrades)
+
+
+@pytest.mark.parametrize("file", DAYS)
+def test_bank_matches_backtrader(file):
+    data, df = PandasData(file)
+    cerebro, strat = run_once(
+        data,
+        name=file,
+        plot=False,
+        whma_sequence=[],
+        partial_run=None,
+        period=PERIOD,
+        greedy=True,
+        whma_params=WHMA_PARAMS,
+        headless=True,
+    )
+    bank = compute_whma_bank(df, WHMA_PARAMS)
+    assert np.array_equal(
+        [whma.l.opentrades.array for whma in strat.whmas], bank.opentrades
+    )
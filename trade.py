@@ -1,12 +1,19 @@
 #!python3
 from collections import deque
+import contextlib
 import datetime
+import heapq
 import math  # For datetime objects
 import os.path
 import random  # To manage paths
 import sys
+import time
 from typing import Iterable  # To find out the script name (in argv[0])
+from mytrade import profiling
+from mytrade.cluster import Coordinator, LocalCluster, generate_authkey, parse_address
+from mytrade.dp_solver import solve_whma_sequence
 from mytrade.pandadata import PandasData
+from mytrade.score_cache import ScoreCache, cached
 from mytrade.strategy import DerStrategy
 from mytrade.plotting import Bokeh
 import click
@@ -14,81 +21,107 @@ import warnings
 
 # Import the backtrader platform
 import backtrader as bt
+from mytrade.shared_signals import SharedSignals, score_path
 from mytrade.whma_observer import WHMAObserver
-from mytrade.whma_selector import WHMASelector
+from mytrade.whma_selector import SelectorSnapshot, WHMASelector
+from mytrade.worker_bank import BankEvaluator, load_bank
 from mytrade.selector_observer import SelectorObserver
 from pandas.errors import PerformanceWarning
 from pathos.multiprocessing import ProcessPool
 
 warnings.simplefilter("ignore", PerformanceWarning)
 
+R = range(3, 40, 8)
+WHMA_PARAMS = [(h1, h2) for h1 in R for h2 in R]
+PERIOD = 2
+BEAM_WIDTH = 64
+
 
 @click.command()
 @click.option("--plot", is_flag=True)
 @click.option("-s", "--search-best-seq", is_flag=True)
-def main(plot=False, search_best_seq=False):
+@click.option("--shared-memory", is_flag=True)
+@click.option(
+    "--worker-bank", is_flag=True, help="Build the WHMA lines once per worker."
+)
+@click.option("--score-cache", is_flag=True, help="Reuse scores of earlier runs.")
+@click.option("--solver", type=click.Choice(["bfs", "beam", "dp"]), default="bfs")
+@click.option(
+    "--beam-width",
+    type=click.IntRange(min=1),
+    default=BEAM_WIDTH,
+    help="Paths kept per level.",
+)
+@click.option(
+    "--diversity",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Most paths kept per level that end on the same WHMA.",
+)
+@click.option("--timeframe", type=int, default=None, help="Bar size in minutes.")
+@click.option("--workers", type=int, default=None, help="Run a local cluster.")
+@click.option("--listen", default=None, help="HOST:PORT to serve worker.py on.")
+@click.option(
+    "--authkey",
+    default=None,
+    envvar="TRADE_AUTHKEY",
+    help="Key of --listen's workers, random if not given.",
+)
+@click.option("--profile", is_flag=True)
+@click.option("--profile-output", default="./profile.json")
+def main(
+    plot=False,
+    search_best_seq=False,
+    shared_memory=False,
+    worker_bank=False,
+    score_cache=False,
+    solver="bfs",
+    beam_width=BEAM_WIDTH,
+    diversity=None,
+    timeframe=None,
+    workers=None,
+    listen=None,
+    authkey=None,
+    profile=False,
+    profile_output="./profile.json",
+):
+    if listen and workers:
+        raise click.UsageError("--listen and --workers are exclusive")
+    if listen and shared_memory:
+        # remote workers cannot attach a shared memory block of this machine
+        raise click.UsageError("--shared-memory only works with local workers")
+    if profile:
+        profiling.enable()
+    started = time.perf_counter()
     file = "./data/2022-09-09.csv"
-    data, df = PandasData(file)
-    data_len = df.shape[0]
-    R = range(3, 40, 8)
-    whma_params = [(h1, h2) for h1 in R for h2 in R]
-    whmas_count = len(whma_params)
-    period = 2
-    num_periods = math.ceil(data_len / period)
-
-    def eval_profit(path) -> float:
-        cerebro, strat = run_once(
-            data=data,
-            name=file,
-            plot=False,
-            whma_sequence=path,
-            partial_run=len(path),
-            period=period,
-            greedy=False,
-            whma_params=whma_params,
+    # the search runs on a ProcessPool unless a cluster takes over its tasks
+    cluster = contextlib.nullcontext()
+    if workers:
+        cluster = LocalCluster(workers)
+    elif listen:
+        if authkey is None:
+            authkey = generate_authkey()
+            print(f"run workers with: worker.py {listen} --authkey {authkey}")
+        coordinator = Coordinator(parse_address(listen), authkey=authkey.encode())
+        cluster = contextlib.nullcontext(coordinator)
+    with cluster as coordinator:
+        best_profit, best_path = search_day(
+            file,
+            solver=solver,
+            shared_memory=shared_memory,
+            worker_bank=worker_bank,
+            score_cache=score_cache,
+            beam_width=beam_width,
+            diversity=diversity,
+            timeframe=timeframe,
+            imap=coordinator.imap if coordinator else None,
         )
-        return (strat.selector.get_score(), path)
-
-    ### BFS with pruning
-    edges = list(range(whmas_count))
-    queue = deque([(0, [e]) for e in edges])
-    levels = 1
-    with ProcessPool() as pool:
-        while queue:
-            next_level = []
-            while queue:
-                pathprofit, path = queue.popleft()
-                print(pathprofit, path)
-                next_level.extend(pool.uimap(eval_profit, [path + [e] for e in edges]))
-            random.shuffle(next_level)
-            queue.extend(next_level)
-
-            if levels % 3 == 0:
-                # pruning every N levels
-                queue = list(queue)
-                queue.sort(reverse=True)
-                scores = [s for s, _ in queue]
-                best_score = scores[0]
-                queue = [(s, p) for (s, p) in queue if s == best_score]
-                random.shuffle(queue)
-                queue = deque(queue)
-
-            levels += 1
-            if levels > num_periods:
-                break
-
-    best_profit, best_path = sorted(queue)[-1]
     print(best_profit, best_path)
-    cerebro, derstrat = run_once(
-        data=data,
-        name=file,
-        plot=plot,
-        whma_sequence=best_path,
-        whma_params=whma_params,
-        partial_run=False,
-        period=period,
-        greedy=False,
-    )
+    cerebro, derstrat = run_day(file, best_path, plot=plot, timeframe=timeframe)
+    if profile:
+        wall = time.perf_counter() - started
+        profiling.print_report(wall)
+        profiling.dump(profile_output, wall)
 
     # profit_sofar = 0
     # path_sofar = []
@@ -161,6 +194,243 @@ def main(plot=False, search_best_seq=False):
     # return profit_sofar, path_sofar
 
 
+def search_day(
+    file,
+    *,
+    solver="bfs",
+    shared_memory=False,
+    worker_bank=False,
+    score_cache=False,
+    whma_params=WHMA_PARAMS,
+    period=PERIOD,
+    imap=None,
+    max_levels=None,
+    beam_width=BEAM_WIDTH,
+    diversity=None,
+    timeframe=None,
+) -> tuple[float, list[int]]:
+    data, df = PandasData(file, timeframe)
+    data_len = df.shape[0]
+    whmas_count = len(whma_params)
+    num_periods = math.ceil(data_len / period)
+    evaluator = BankEvaluator(
+        file=file,
+        whma_params=tuple(tuple(x) for x in whma_params),
+        period=period,
+        timeframe=timeframe,
+    )
+
+    if solver == "dp":
+        opentrades, ohlc4 = load_bank(evaluator)
+        with profiling.phase("solve_whma_sequence"):
+            return solve_whma_sequence(opentrades, ohlc4, period=period)
+
+    signals = contextlib.nullcontext()
+    if shared_memory:
+        # The WHMA lines are computed once here and workers attach to them
+        # instead of receiving the data feed and rebuilding Cerebro per task.
+        signals = SharedSignals(*load_bank(evaluator))
+        spec = signals.spec
+
+        def eval_profit(args) -> tuple[float, list[int], SelectorSnapshot]:
+            path, snapshot = args
+            with profiling.phase("score_path"):
+                snapshot = score_path(spec, path, period=period, snapshot=snapshot)
+            return (snapshot.score(), path, snapshot)
+
+    elif worker_bank:
+        # Tasks carry only this spec and the path. Each worker builds the
+        # WHMA lines once instead of receiving the data feed and rebuilding
+        # Cerebro per task.
+        eval_profit = evaluator
+
+    else:
+        # Every task rebuilds Cerebro and runs all WHMAs over the whole day.
+        # The parent's snapshot only spares the selector its prefix periods,
+        # while the two options above score an extension in one period.
+
+        def eval_profit(args) -> tuple[float, list[int], SelectorSnapshot]:
+            path, snapshot = args
+            cerebro, strat = run_once(
+                data=data,
+                name=file,
+                plot=False,
+                whma_sequence=path,
+                partial_run=len(path),
+                period=period,
+                greedy=False,
+                whma_params=whma_params,
+                snapshot=snapshot,
+                headless=True,
+            )
+            selector = strat.selector
+            with profiling.phase("get_score"):
+                score = selector.get_score()
+            return (score, path, selector.export_snapshot())
+
+    if score_cache:
+        eval_profit = cached(
+            eval_profit,
+            ScoreCache.for_day(
+                file, whma_params=whma_params, period=period, timeframe=timeframe
+            ),
+        )
+
+    with signals:
+        if solver == "beam":
+            return search_beam(
+                eval_profit,
+                whmas_count=whmas_count,
+                num_periods=min(num_periods, max_levels or num_periods),
+                beam_width=beam_width,
+                diversity=diversity,
+                imap=imap,
+            )
+        return search_bfs(
+            eval_profit,
+            whmas_count=whmas_count,
+            num_periods=min(num_periods, max_levels or num_periods),
+            imap=imap,
+        )
+
+
+def run_day(
+    file,
+    whma_sequence,
+    *,
+    plot,
+    whma_params=WHMA_PARAMS,
+    period=PERIOD,
+    timeframe=None,
+):
+    data, df = PandasData(file, timeframe)
+    return run_once(
+        data=data,
+        name=file,
+        plot=plot,
+        whma_sequence=whma_sequence,
+        whma_params=whma_params,
+        partial_run=False,
+        period=period,
+        greedy=False,
+    )
+
+
+def search_bfs(
+    eval_profit, *, whmas_count, num_periods, imap=None
+) -> tuple[float, list[int]]:
+    ### BFS with pruning
+    edges = list(range(whmas_count))
+    queue = deque([(0, [e]) for e in edges])
+    # selector state at the end of every path in the queue, so that extending
+    # a path resumes from its prefix instead of replaying from bar 0
+    snapshots: dict[tuple[int, ...], SelectorSnapshot] = {}
+    levels = 1
+    # imap defaults to a fresh ProcessPool; callers that already run inside a
+    # pool worker pass a serial map instead
+    pool = ProcessPool() if imap is None else contextlib.nullcontext()
+    with pool:
+        imap = imap or pool.uimap
+        while queue:
+            next_level = []
+            next_snapshots = {}
+            tasks = []
+            while queue:
+                pathprofit, path = queue.popleft()
+                print(pathprofit, path)
+                snapshot = snapshots.get(tuple(path))
+                tasks.extend((path + [e], snapshot) for e in edges)
+            # the whole level goes out in one call, so that a pool or a
+            # cluster can split the frontier across all of its workers
+            with profiling.phase("pool dispatch"):
+                results = list(
+                    profiling.merge_results(
+                        imap(profiling.worker_task(eval_profit), tasks)
+                    )
+                )
+            for score, npath, nsnapshot in results:
+                next_level.append((score, npath))
+                next_snapshots[tuple(npath)] = nsnapshot
+            random.shuffle(next_level)
+            queue.extend(next_level)
+
+            if levels % 3 == 0:
+                # pruning every N levels
+                queue = list(queue)
+                queue.sort(reverse=True)
+                scores = [s for s, _ in queue]
+                best_score = scores[0]
+                queue = [(s, p) for (s, p) in queue if s == best_score]
+                random.shuffle(queue)
+                queue = deque(queue)
+
+            snapshots = {tuple(p): next_snapshots[tuple(p)] for _, p in queue}
+            levels += 1
+            if levels > num_periods:
+                break
+
+    return sorted(queue)[-1]
+
+
+def search_beam(
+    eval_profit, *, whmas_count, num_periods, beam_width, diversity=None, imap=None
+) -> tuple[float, list[int]]:
+    """Keeps the beam_width best paths after every level.
+
+    Unlike search_bfs() the frontier never grows past beam_width * whmas_count
+    paths, and ties with the best score are cut by the width instead of all
+    being kept. With diversity, at most that many of the kept paths may end
+    on the same WHMA, so that one WHMA cannot take over the whole beam.
+    """
+    assert beam_width >= 1, "an empty beam has no paths to extend"
+    assert diversity is None or diversity >= 1, "diversity would empty the beam"
+    edges = list(range(whmas_count))
+    beam: list[tuple[float, list[int]]] = [(0, [])]
+    snapshots: dict[tuple[int, ...], SelectorSnapshot] = {}
+    pool = ProcessPool() if imap is None else contextlib.nullcontext()
+    with pool:
+        imap = imap or pool.uimap
+        for level in range(num_periods):
+            tasks = [
+                (path + [e], snapshots.get(tuple(path)))
+                for _, path in beam
+                for e in edges
+            ]
+            with profiling.phase("pool dispatch"):
+                results = list(
+                    profiling.merge_results(
+                        imap(profiling.worker_task(eval_profit), tasks)
+                    )
+                )
+            # uimap returns results out of order, and ties should not favour
+            # whichever path happened to finish first
+            random.shuffle(results)
+            results = _top_paths(results, beam_width, diversity)
+            beam = [(score, path) for score, path, _ in results]
+            snapshots = {tuple(path): snapshot for _, path, snapshot in results}
+            print(level + 1, beam[0][0], beam[0][1])
+
+    return beam[0]
+
+
+def _top_paths(results: list, k: int, diversity=None) -> list:
+    """The k highest scoring of the (score, path, snapshot) results."""
+
+    def score(result):
+        return result[0]
+
+    if diversity is not None:
+        by_last_whma = {}
+        for result in results:
+            by_last_whma.setdefault(result[1][-1], []).append(result)
+        results = [
+            result
+            for group in by_last_whma.values()
+            for result in heapq.nlargest(diversity, group, key=score)
+        ]
+    return heapq.nlargest(k, results, key=score)
+
+
 def run_once(
     data,
     *,
@@ -171,33 +441,80 @@ def run_once(
     partial_run,
     greedy,
     whma_params,
+    snapshot=None,
+    headless=False,
+    compact=False,
+):
+    # A headless run skips the observers and every plot-only line, for runs
+    # that only read the selector's score. A compact one also keeps only the
+    # recent bars of the WHMA lines the selector does not read, which saves
+    # memory on long multi-day feeds but costs some on a single day.
+    assert not (plot and headless), "a headless run cannot be plotted"
+    with profiling.phase("build cerebro"):
+        cerebro = build_cerebro(
+            data,
+            name=name,
+            whma_sequence=whma_sequence,
+            period=period,
+            partial_run=partial_run,
+            greedy=greedy,
+            whma_params=whma_params,
+            snapshot=snapshot,
+            headless=headless,
+            compact=compact,
+        )
+
+    # Run over everything
+    with profiling.phase("cerebro.run"):
+        [derstrat] = cerebro.run()
+
+    # Plot the result
+    if plot:
+        cerebro.plot(Bokeh())
+
+    return cerebro, derstrat
+
+
+def build_cerebro(
+    data,
+    *,
+    name,
+    whma_sequence,
+    period,
+    partial_run,
+    greedy,
+    whma_params,
+    snapshot,
+    headless=False,
+    compact=False,
 ):
     # Create a cerebro entity
     cerebro = bt.Cerebro(stdstats=False)
 
-    cerebro.addobserver(
-        SelectorObserver,
-        get_selector=lambda strat: strat.selector,
-        display_plots="price",
-    )
+    if not headless:
+        cerebro.addobserver(
+            SelectorObserver,
+            get_selector=lambda strat: strat.selector,
+            display_plots="price",
+        )
 
-    cerebro.addobserver(
-        SelectorObserver,
-        get_selector=lambda strat: strat.selector,
-        display_plots="sequence",
-    )
+        cerebro.addobserver(
+            SelectorObserver,
+            get_selector=lambda strat: strat.selector,
+            display_plots="sequence",
+        )
 
-    cerebro.addobserver(
-        SelectorObserver,
-        get_selector=lambda strat: strat.selector,
-        display_plots="value",
-    )
+        cerebro.addobserver(
+            SelectorObserver,
+            get_selector=lambda strat: strat.selector,
+            display_plots="value",
+        )
 
-    cerebro.addobserver(
-        SelectorObserver,
-        get_selector=lambda strat: strat.selector,
-        display_plots="profit",
-    )
+        cerebro.addobserver(
+            SelectorObserver,
+            get_selector=lambda strat: strat.selector,
+            display_plots="profit",
+        )
     # for i in range(len(DerStrategy.whma_params)):
     #     # cerebro.addobserver(
     #     #     SelectorObserver,
@@ -230,19 +547,14 @@ def run_once(
         period=period,
         greedy=greedy,
         whma_params=whma_params,
+        snapshot=snapshot,
+        headless=headless,
+        compact=compact,
     )
 
     # Set our desired cash start
     cerebro.broker.setcash(100000.0)
-
-    # Run over everything
-    [derstrat] = cerebro.run()
-
-    # Plot the result
-    if plot:
-        cerebro.plot(Bokeh())
-
-    return cerebro, derstrat
+    return cerebro
 
 
 if __name__ == "__main__":
@@ -0,0 +1,157 @@
+#!python3
+from dataclasses import asdict, dataclass
+import itertools
+import json
+import math
+import random
+import time
+import click
+from pathos.multiprocessing import ProcessPool
+from batch import day_of, select_days
+from mytrade.dp_solver import solve_whma_sequence
+from mytrade.pandadata import PandasData
+from mytrade.whma_engine import compute_whma_bank
+
+
+@dataclass(frozen=True, kw_only=True, slots=True)
+class TuneConfig:
+    # range(*h_range) of h1 and of h2, like trade.R
+    h_range: tuple[int, int, int]
+    h3: int
+    stopprofit: float
+    period: int
+
+    def whma_params(self) -> list[tuple[int, int]]:
+        R = range(*self.h_range)
+        return [(h1, h2) for h1 in R for h2 in R]
+
+
+def parse_range(value: str) -> tuple[int, int, int]:
+    start, stop, step = (int(x) for x in value.split(":"))
+    return start, stop, step
+
+
+def score_day(args) -> tuple[int, str, float]:
+    """Best selector score of one day for one config, found by the dp solver.
+
+    Configs are returned by their key, since a copy unpickled from a worker
+    does not compare equal to a dataclass defined in __main__.
+    """
+    key, config, file = args
+    data, df = PandasData(file)
+    bank = compute_whma_bank(
+        df, config.whma_params(), h3=config.h3, stopprofit=config.stopprofit
+    )
+    score, path = solve_whma_sequence(bank.opentrades, bank.ohlc4, period=config.period)
+    return key, file, score
+
+
+def successive_halving(configs, files, *, min_days, eta, imap, on_result):
+    """Scores configs on min_days days, keeps the best 1/eta and repeats.
+
+    Each round multiplies the days by eta until the survivors have been scored
+    on all files. Scores of earlier rounds are reused, so a config is never
+    scored twice on the same day. Returns (config, mean score) best first.
+    """
+    assert min_days >= 1, "the first round needs a day"
+    assert eta >= 2, "each round must shrink the configs and grow the days"
+    scores: dict[TuneConfig, dict[str, float]] = {c: {} for c in configs}
+    n_days = min(min_days, len(files))
+    rung = 0
+    while True:
+        days = files[:n_days]
+        tasks = [
+            (i, c, f) for i, c in enumerate(configs) for f in days if f not in scores[c]
+        ]
+        for i, file, score in imap(score_day, tasks):
+            config = configs[i]
+            scores[config][file] = score
+            on_result(rung=rung, config=config, file=file, score=score)
+        ranking = sorted(
+            ((c, sum(scores[c][f] for f in days) / len(days)) for c in configs),
+            key=lambda x: x[1],
+            reverse=True,
+        )
+        if n_days == len(files) or len(configs) == 1:
+            return ranking
+        configs = [c for c, _ in ranking[: max(1, len(configs) // eta)]]
+        n_days = min(len(files), n_days * eta)
+        rung += 1
+
+
+@click.command()
+@click.option("--glob", "pattern", default="./data/*.csv")
+@click.option("--start", default=None, help="First day, YYYY-MM-DD.")
+@click.option("--end", default=None, help="Last day, YYYY-MM-DD.")
+@click.option(
+    "--h-range", multiple=True, default=["3:40:8"], help="start:stop:step of h1, h2."
+)
+@click.option("--h3", multiple=True, type=int, default=[3])
+@click.option("--stopprofit", multiple=True, type=float, default=[0.05])
+@click.option("--period", multiple=True, type=int, default=[2])
+@click.option("--random", "n_random", type=int, default=None, help="Sample N configs.")
+@click.option(
+    "--min-days", type=click.IntRange(min=1), default=4, help="Days of the first round."
+)
+@click.option(
+    "--eta",
+    type=click.IntRange(min=2),
+    default=2,
+    help="Keep 1/eta of the configs each round.",
+)
+@click.option("--seed", default=0)
+@click.option("-o", "--output", default="./tune_results.jsonl")
+def main(
+    pattern,
+    start,
+    end,
+    h_range,
+    h3,
+    stopprofit,
+    period,
+    n_random,
+    min_days,
+    eta,
+    seed,
+    output,
+):
+    random.seed(seed)
+    configs = [
+        TuneConfig(h_range=parse_range(r), h3=a, stopprofit=b, period=c)
+        for r, a, b, c in itertools.product(h_range, h3, stopprofit, period)
+    ]
+    if n_random is not None:
+        configs = random.sample(configs, min(n_random, len(configs)))
+    # shuffled so that the first rounds sample the whole date range
+    files = select_days(pattern, start, end)
+    random.shuffle(files)
+    if not configs or not files:
+        print(f"{len(configs)} configs, {len(files)} days")
+        return
+    rounds = 1 + max(0, math.ceil(math.log(len(files) / min_days, eta)))
+    print(f"{len(configs)} configs, {len(files)} days, up to {rounds} rounds")
+
+    started = time.time()
+    with open(output, "w") as out, ProcessPool() as pool:
+
+        def on_result(*, rung, config, file, score):
+            record = {"rung": rung, **asdict(config), "day": day_of(file)}
+            record["score"] = score
+            record["elapsed"] = time.time() - started
+            print(json.dumps(record), file=out, flush=True)
+
+        ranking = successive_halving(
+            configs,
+            files,
+            min_days=min_days,
+            eta=eta,
+            imap=pool.uimap,
+            on_result=on_result,
+        )
+
+    for config, score in ranking[:10]:
+        print(f"{score:>10.2f} {asdict(config)}")
+
+
+if __name__ == "__main__":
+    main()
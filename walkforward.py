@@ -0,0 +1,141 @@
+#!python3
+from dataclasses import asdict, dataclass
+import itertools
+import time
+import click
+import pandas as pd
+from pathos.multiprocessing import ProcessPool
+from batch import day_of, select_days
+from mytrade.dp_solver import solve_whma_sequence
+from mytrade.pandadata import PandasData
+from mytrade.streaming import replay_bank
+from mytrade.whma_engine import compute_whma_bank
+from tune import TuneConfig, parse_range
+
+
+@dataclass(frozen=True, kw_only=True, slots=True)
+class WindowResult:
+    train_start: str
+    train_end: str
+    test_day: str
+    config: str
+    train_score: float
+    test_score: float
+    test_oracle: float
+
+
+def evaluate_day(args) -> tuple[int, str, float, float]:
+    """Causal and hindsight scores of one config on one day.
+
+    The causal score is the streaming selector's, which only picks a WHMA from
+    periods that already ended, and the oracle is the dp solver's best path.
+    Configs are returned by their key, like tune.score_day().
+    """
+    key, config, file = args
+    data, df = PandasData(file)
+    bank = compute_whma_bank(
+        df, config.whma_params(), h3=config.h3, stopprofit=config.stopprofit
+    )
+    causal = replay_bank(bank.opentrades, bank.ohlc4, period=config.period).score()
+    oracle, path = solve_whma_sequence(
+        bank.opentrades, bank.ohlc4, period=config.period
+    )
+    return key, file, causal, oracle
+
+
+def walk_forward(configs, files, *, window, imap, on_window):
+    """Tunes on each run of window days and tests the winner on the next day.
+
+    Every (config, day) pair is evaluated once, in day order, and the scores
+    are shared by all windows the day belongs to. A window is decided as soon
+    as its days and its test day are all scored. Returns the WindowResults in
+    day order.
+    """
+    assert window >= 1, "a window needs a day to tune on"
+    causal: dict[str, dict[int, float]] = {f: {} for f in files}
+    oracle: dict[str, dict[int, float]] = {f: {} for f in files}
+    tasks = [(i, c, f) for f in files for i, c in enumerate(configs)]
+    windows = [
+        (files[start : start + window], files[start + window])
+        for start in range(len(files) - window)
+    ]
+    results = []
+    for key, file, causal_score, oracle_score in imap(evaluate_day, tasks):
+        causal[file][key] = causal_score
+        oracle[file][key] = oracle_score
+        while len(results) < len(windows):
+            train, test = windows[len(results)]
+            if any(len(causal[f]) < len(configs) for f in (*train, test)):
+                break
+            train_scores = [
+                sum(causal[f][i] for f in train) / len(train)
+                for i in range(len(configs))
+            ]
+            best = max(range(len(configs)), key=train_scores.__getitem__)
+            result = WindowResult(
+                train_start=day_of(train[0]),
+                train_end=day_of(train[-1]),
+                test_day=day_of(test),
+                config=str(asdict(configs[best])),
+                train_score=train_scores[best],
+                test_score=causal[test][best],
+                test_oracle=oracle[test][best],
+            )
+            results.append(result)
+            on_window(result)
+    return results
+
+
+@click.command()
+@click.option("--glob", "pattern", default="./data/*.csv")
+@click.option("--start", default=None, help="First day, YYYY-MM-DD.")
+@click.option("--end", default=None, help="Last day, YYYY-MM-DD.")
+@click.option(
+    "--window",
+    type=click.IntRange(min=1),
+    default=1,
+    help="Training days before each test day.",
+)
+@click.option(
+    "--h-range", multiple=True, default=["3:40:8"], help="start:stop:step of h1, h2."
+)
+@click.option("--h3", multiple=True, type=int, default=[3])
+@click.option("--stopprofit", multiple=True, type=float, default=[0.05])
+@click.option("--period", multiple=True, type=int, default=[2])
+@click.option("-o", "--output", default="./walkforward_summary.csv")
+def main(pattern, start, end, window, h_range, h3, stopprofit, period, output):
+    configs = [
+        TuneConfig(h_range=parse_range(r), h3=a, stopprofit=b, period=c)
+        for r, a, b, c in itertools.product(h_range, h3, stopprofit, period)
+    ]
+    files = select_days(pattern, start, end)
+    print(f"{len(configs)} configs, {len(files)} days, window {window}")
+    if len(files) <= window:
+        return
+
+    started = time.time()
+
+    def on_window(result: WindowResult):
+        print(
+            f"{result.train_start}..{result.train_end} -> {result.test_day} "
+            f"train {result.train_score:.2f} test {result.test_score:.2f} "
+            f"oracle {result.test_oracle:.2f} {time.time() - started:.1f}s",
+            flush=True,
+        )
+
+    with ProcessPool() as pool:
+        results = walk_forward(
+            configs, files, window=window, imap=pool.uimap, on_window=on_window
+        )
+
+    summary = pd.DataFrame([asdict(x) for x in results])
+    summary.to_csv(output, index=False)
+    print(
+        f"out of sample {summary.test_score.sum():.2f} "
+        f"(mean {summary.test_score.mean():.2f}), "
+        f"hindsight {summary.test_oracle.sum():.2f} over {len(summary)} test days"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+#!python3
+import click
+from mytrade.cluster import parse_address, run_worker
+
+
+@click.command()
+@click.argument("address")
+@click.option(
+    "--authkey",
+    required=True,
+    envvar="TRADE_AUTHKEY",
+    help="The key trade.py --listen printed or was given.",
+)
+def main(address, authkey):
+    """Evaluates search tasks for trade.py --listen ADDRESS until it exits."""
+    run_worker(parse_address(address), authkey.encode())
+
+
+if __name__ == "__main__":
+    main()